@@ -1,9 +1,14 @@
-import requests
+import os
+import sys
+
+# Shared helpers (forgehub/) live at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+from forgehub.client import shared_client
 
 LINODE_API_URL = "https://api.linode.com/v4/linode/types"
 
 def get_gpu_pricing():
-    response = requests.get(LINODE_API_URL)
+    response = shared_client().fetch(LINODE_API_URL)
     data = response.json()
     
     gpu_instances = [plan for plan in data['data'] if "gpu" in plan['id']]
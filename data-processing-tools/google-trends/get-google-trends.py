@@ -1,8 +1,17 @@
+import os
+import sys
 import requests
 from bs4 import BeautifulSoup
 import urllib.parse
 import logging
 
+# Shared helpers (forgehub/) live at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from forgehub.client import shared_client
+
+# One keep-alive connection pool for every request this script makes
+client = shared_client()
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -27,7 +36,7 @@ def google_search_requests(query, num_results=10):
     }
     
     try:
-        response = requests.get(base_url, params=params, headers=headers)
+        response = client.get(base_url, params=params, headers=headers)
         response.raise_for_status()  # Raise an exception for bad status codes
         
         soup = BeautifulSoup(response.text, 'html.parser')
@@ -66,7 +75,7 @@ def google_custom_search(query, api_key, cx, num_results=10):
     }
     
     try:
-        response = requests.get(base_url, params=params)
+        response = client.get(base_url, params=params)
         response.raise_for_status()
         
         # Parse and extract relevant search results
@@ -101,7 +110,7 @@ def serpapi_search(query, api_key, num_results=10):
     }
     
     try:
-        response = requests.get(base_url, params=params)
+        response = client.get(base_url, params=params)
         response.raise_for_status()
         
         # Parse and extract relevant search results
@@ -1,8 +1,21 @@
 import os
+import sys
 import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 
+# Shared helpers (forgehub/) live at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+from forgehub.client import shared_client
+from forgehub.store import shared_store
+from forgehub.telemetry import TELEMETRY, job_scope
+from forgehub.urls import dedupe_urls
+
+# One keep-alive connection pool for every request this script makes
+client = shared_client()
+# Images already downloaded (by any run or script) are linked instead of fetched again
+store = shared_store()
+
 # Settings
 INPUT_FILE = "website-urls.txt"
 OUTPUT_DIR = "downloaded_images"
@@ -22,11 +35,13 @@ def sanitize_filename(url):
 # Download image
 def download_image(url, prefix=""):
     try:
-        headers = {"User-Agent": "Mozilla/5.0"}
         print(f"[+] Checking URL: {url}")
-        r = requests.get(url, headers=headers, timeout=10, stream=True)
-        r.raise_for_status()
-        content_type = r.headers.get("Content-Type", "").lower()
+        # r is None when the stored copy of url is still current (see MediaStore.open)
+        r, entry = store.open(url, client, timeout=10)
+        if r is None:
+            content_type = (entry["content_type"] or "").lower()
+        else:
+            content_type = r.headers.get("Content-Type", "").lower()
 
         if "image" in content_type or is_image_by_extension(url):
             path = urlparse(url).path
@@ -40,12 +55,19 @@ def download_image(url, prefix=""):
             filename = prefix + base + ext
             filepath = os.path.join(OUTPUT_DIR, filename)
 
-            with open(filepath, "wb") as f:
-                for chunk in r.iter_content(1024):
-                    f.write(chunk)
+            try:
+                if r is None:
+                    store.materialize(entry["digest"], filepath)
+                else:
+                    store.save(url, r, filepath)
+            except requests.exceptions.RequestException:
+                # Connection dropped mid-body: download it again from the start
+                store.fetch(url, filepath, client, timeout=10)
             print(f"[✓] Saved: {filepath}")
             return True
         else:
+            if r is not None:
+                r.close()
             print(f"[*] Not a direct image, parsing HTML: {url}")
             return False
     except Exception as e:
@@ -54,10 +76,8 @@ def download_image(url, prefix=""):
 
 # Process HTML page to extract <img> links
 def process_webpage(url):
-    headers = {"User-Agent": "Mozilla/5.0"}
     try:
-        r = requests.get(url, headers=headers, timeout=10)
-        r.raise_for_status()
+        r = client.fetch(url, timeout=10)
         soup = BeautifulSoup(r.text, "html.parser")
         images = soup.find_all("img")
 
@@ -65,11 +85,13 @@ def process_webpage(url):
             print(f"[!] No <img> tags found on: {url}")
             return
 
-        for i, img in enumerate(images):
-            img_src = img.get("src")
-            if not img_src:
-                continue
-            full_url = urljoin(url, img_src)
+        # The same image is often referenced several times (or via http and https)
+        full_urls = [urljoin(url, img.get("src")) for img in images if img.get("src")]
+        groups, removed = dedupe_urls(full_urls)
+        if removed:
+            print(f"[i] Removed {removed} duplicate image URLs on: {url}")
+
+        for i, full_url in enumerate(groups):
             download_image(full_url, prefix=f"{i}_")
     except Exception as e:
         print(f"[×] Error parsing HTML at {url}: {e}")
@@ -80,8 +102,12 @@ def main():
 
     for url in urls:
         print(f"\n=== Processing: {url} ===")
-        if not download_image(url):  # if not a direct image
-            process_webpage(url)
+        with job_scope(url):
+            if not download_image(url):  # if not a direct image
+                process_webpage(url)
+
+    # Request timings per host and per input URL
+    TELEMETRY.export(os.path.join(OUTPUT_DIR, "telemetry"))
 
 if __name__ == "__main__":
     main()
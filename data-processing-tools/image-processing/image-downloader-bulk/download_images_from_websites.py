@@ -1,10 +1,23 @@
 import os
 import re
+import sys
 import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 from datetime import datetime
 
+# Shared helpers (forgehub/) live at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+from forgehub.client import shared_client
+from forgehub.store import shared_store
+from forgehub.telemetry import TELEMETRY, job_scope
+from forgehub.urls import dedupe_urls
+
+# One keep-alive connection pool for every request this script makes
+client = shared_client()
+# Images already downloaded (by any run or script) are linked instead of fetched again
+store = shared_store()
+
 def create_folder(folder_name):
     """Create a folder if it doesn't exist."""
     if not os.path.exists(folder_name):
@@ -19,31 +32,28 @@ def get_domain_name(url):
 def download_image(image_url, folder_name):
     """Download an image from the given URL and save it to the specified folder."""
     try:
-        response = requests.get(image_url, stream=True)
-        if response.status_code == 200:
-            image_name = os.path.join(folder_name, os.path.basename(image_url))
-            with open(image_name, 'wb') as file:
-                for chunk in response.iter_content(1024):
-                    file.write(chunk)
-            print(f"Downloaded: {image_name}")
-        else:
-            print(f"Failed to download: {image_url}")
+        image_name = os.path.join(folder_name, os.path.basename(image_url))
+        how = store.fetch(image_url, image_name, client, timeout=10)
+        print(f"Downloaded: {image_name} ({how})")
+    except requests.exceptions.HTTPError:
+        print(f"Failed to download: {image_url}")
     except Exception as e:
         print(f"Error downloading {image_url}: {e}")
 
 def find_images_in_website(url, folder_name):
     """Find all images on a website and download them."""
     try:
-        response = requests.get(url)
+        response = client.get(url)
         soup = BeautifulSoup(response.text, 'html.parser')
 
+        image_urls = []
+
         # Find all image tags
         for img_tag in soup.find_all('img'):
             img_url = img_tag.get('src')
             if img_url:
                 # Handle relative URLs
-                img_url = urljoin(url, img_url)
-                download_image(img_url, folder_name)
+                image_urls.append(urljoin(url, img_url))
 
         # Find embedded images (e.g., in CSS or JavaScript)
         for tag in soup.find_all(['style', 'script']):
@@ -51,12 +61,18 @@ def find_images_in_website(url, folder_name):
                 # Extract URLs from CSS
                 css_urls = re.findall(r'url\((.*?)\)', tag.string or '')
                 for css_url in css_urls:
-                    css_url = urljoin(url, css_url.strip('\'"'))
-                    download_image(css_url, folder_name)
+                    image_urls.append(urljoin(url, css_url.strip('\'"')))
             elif tag.name == 'script':
                 # Extract URLs from JavaScript (if needed)
                 pass
 
+        # Download each image once, however many times (and ways) it is referenced
+        groups, removed = dedupe_urls(image_urls)
+        if removed:
+            print(f"Removed {removed} duplicate image URLs on {url}")
+        for image_url in groups:
+            download_image(image_url, folder_name)
+
     except Exception as e:
         print(f"Error processing {url}: {e}")
 
@@ -79,7 +95,11 @@ def download_images_from_websites(file_path):
         folder_name = create_folder(f"{domain_name}_{timestamp}")
 
         print(f"Downloading images from: {website_url}")
-        find_images_in_website(website_url, folder_name)
+        with job_scope(website_url):
+            find_images_in_website(website_url, folder_name)
+
+    # Request timings per host and per website
+    TELEMETRY.export("telemetry")
 
 if __name__ == "__main__":
     # Path to the file containing URLs
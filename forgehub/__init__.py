@@ -0,0 +1,6 @@
+"""
+Helpers shared by the ForgeHub download scripts.
+
+The scripts aren't installed as a package; each one puts the repository root
+on sys.path before importing from here.
+"""
@@ -0,0 +1,193 @@
+import os
+import re
+import json
+import gzip
+import time
+import difflib
+import hashlib
+
+MANIFEST = "manifest.jsonl"
+# Snapshots are diffed in chunks: lines, and tags within long (minified) lines
+_CHUNK = re.compile(rb"[^>\n]*[>\n]?")
+# Already compressed: stored as-is, only deduplicated
+RAW_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+# Deltas in a row before a full copy is stored again, bounding the cost of a read
+KEYFRAME_EVERY = 30
+COMPRESS_LEVEL = 6
+
+
+def _delta(base_chunks, chunks):
+    # Copies of base chunk ranges ([i1, i2]) and inserted text (latin-1, so any bytes fit JSON)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, base_chunks, chunks).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(b"".join(chunks[j1:j2]).decode("latin-1"))
+    return ops
+
+
+def _apply(base, ops):
+    base_chunks = _CHUNK.findall(base)
+    return b"".join(b"".join(base_chunks[op[0]:op[1]]) if isinstance(op, list)
+                    else op.encode("latin-1") for op in ops)
+
+
+class CaptureStore:
+    """
+    Timeline of snapshots from a page-monitoring loop (page sources,
+    screenshots, network logs), stored without repeats:
+
+    - every snapshot is content-hashed and an exact repeat only adds a
+      timeline entry
+    - text snapshots are kept as a gzipped delta against the previous
+      snapshot of the same type, or gzipped whole when that is smaller (and
+      at least every KEYFRAME_EVERY versions)
+    - images (RAW_EXTENSIONS) are kept as they are
+
+    manifest.jsonl is the timeline, one {"time", "name", "sha256", "size",
+    "stored"} line per snapshot; objects/ holds the data.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.objects = os.path.join(folder, "objects")
+        self.manifest_path = os.path.join(folder, MANIFEST)
+        self.entries = []
+        self._objects = {}      # sha256 -> manifest entry of the stored copy
+        self._previous = {}     # extension -> (sha256, chunks) of the last snapshot
+        self._manifest = None
+        self._cached = (None, None)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line of an interrupted run
+                    self.entries.append(entry)
+                    if entry["stored"] != "duplicate":
+                        self._objects[entry["sha256"]] = entry
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _object_path(self, sha256, stored, extension):
+        suffix = {"full": ".gz", "delta": ".delta.gz"}.get(stored, extension)
+        return os.path.join(self.objects, sha256 + suffix)
+
+    def _write_object(self, path, data):
+        os.makedirs(self.objects, exist_ok=True)
+        with open(path + ".part", "wb") as f:
+            f.write(data)
+        os.replace(path + ".part", path)
+
+    def save(self, name, data):
+        """
+        Add a snapshot (str or bytes) to the timeline under `name`; returns how
+        it was kept: "duplicate", "delta", "full" or "raw".
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        sha256 = hashlib.sha256(data).hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        entry = {"time": time.time(), "name": name, "sha256": sha256, "size": len(data)}
+        chunks = None if extension in RAW_EXTENSIONS else _CHUNK.findall(data)
+
+        if sha256 in self._objects:
+            entry["stored"] = "duplicate"
+        elif extension in RAW_EXTENSIONS:
+            entry["stored"] = "raw"
+            self._write_object(self._object_path(sha256, "raw", extension), data)
+        else:
+            full = gzip.compress(data, COMPRESS_LEVEL)
+            delta = None
+            previous = self._previous.get(extension)
+            if previous and self._objects[previous[0]].get("depth", 0) < KEYFRAME_EVERY:
+                ops = _delta(previous[1], chunks)
+                delta = gzip.compress(json.dumps(ops).encode(), COMPRESS_LEVEL)
+            if delta is not None and len(delta) < len(full):
+                entry.update(stored="delta", base=previous[0],
+                             depth=self._objects[previous[0]].get("depth", 0) + 1)
+                self._write_object(self._object_path(sha256, "delta", extension), delta)
+            else:
+                entry.update(stored="full", depth=0)
+                self._write_object(self._object_path(sha256, "full", extension), full)
+        if chunks is not None:
+            self._previous[extension] = (sha256, chunks)
+
+        if entry["stored"] != "duplicate":
+            self._objects[sha256] = entry
+        self.entries.append(entry)
+        # The object is on disk before the timeline refers to it
+        if self._manifest is None:
+            os.makedirs(self.folder, exist_ok=True)
+            self._manifest = open(self.manifest_path, "a")
+        self._manifest.write(json.dumps(entry) + "\n")
+        self._manifest.flush()
+        return entry["stored"]
+
+    def read_object(self, sha256):
+        """
+        The bytes of a stored snapshot.
+        """
+        if self._cached[0] == sha256:
+            return self._cached[1]
+        entry = self._objects[sha256]
+        extension = os.path.splitext(entry["name"])[1].lower()
+        with open(self._object_path(sha256, entry["stored"], extension), "rb") as f:
+            data = f.read()
+        if entry["stored"] == "full":
+            data = gzip.decompress(data)
+        elif entry["stored"] == "delta":
+            data = _apply(self.read_object(entry["base"]), json.loads(gzip.decompress(data)))
+        # Reading the timeline in order mostly needs the previous object next
+        self._cached = (sha256, data)
+        return data
+
+    def read(self, name):
+        """
+        The bytes of the latest snapshot saved under `name`.
+        """
+        for entry in reversed(self.entries):
+            if entry["name"] == name:
+                return self.read_object(entry["sha256"])
+        raise KeyError(name)
+
+    def latest(self, extension):
+        """
+        Name of the most recent snapshot ending in `extension`, or None.
+        """
+        for entry in reversed(self.entries):
+            if entry["name"].endswith(extension):
+                return entry["name"]
+        return None
+
+    def snapshots(self, extension=""):
+        """
+        (name, sha256) of every distinct snapshot ending in `extension`, in
+        timeline order; repeats of earlier content are left out.
+        """
+        seen = set()
+        distinct = []
+        for entry in self.entries:
+            if entry["name"].endswith(extension) and entry["sha256"] not in seen:
+                seen.add(entry["sha256"])
+                distinct.append((entry["name"], entry["sha256"]))
+        return distinct
+
+    def summary(self):
+        stored = sum(os.path.getsize(self._object_path(sha256, e["stored"],
+                                                       os.path.splitext(e["name"])[1].lower()))
+                     for sha256, e in self._objects.items())
+        captured = sum(entry["size"] for entry in self.entries)
+        return (f"{len(self.entries)} snapshots, {len(self._objects)} distinct, "
+                f"{stored / 1024:.0f} KB stored for {captured / 1024:.0f} KB captured")
+
+    def close(self):
+        if self._manifest is not None:
+            self._manifest.close()
+            self._manifest = None
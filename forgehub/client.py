@@ -0,0 +1,93 @@
+import threading
+
+import requests
+
+from forgehub import retry
+from forgehub.telemetry import TELEMETRY, RequestRecord, TimedHTTPAdapter
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36")
+# (connect, read) seconds, used when a call doesn't pass its own timeout
+DEFAULT_TIMEOUT = (5, 30)
+# Keep-alive connections kept per host, and how many hosts keep a pool
+POOL_MAXSIZE = 8
+POOL_HOSTS = 32
+
+
+class HttpClient(requests.Session):
+    """
+    requests.Session with the settings every ForgeHub script shares: a
+    keep-alive pool of `pool_maxsize` connections per host, a default timeout
+    and a common User-Agent, so repeated requests to a host reuse one TCP/TLS
+    connection instead of handshaking each time.
+
+    Hooks:
+    - fetch() / call() run requests under `retry_policy` and `breaker`
+      (forgehub.retry defaults when None)
+    - every callable in `observers` is called with a telemetry.RequestRecord
+      (DNS / connect / TTFB / transfer timings, bytes, status, attempt) once
+      each request's body is done; TELEMETRY is subscribed by default
+    - `job` labels this client's requests in telemetry (e.g. the output name)
+    """
+
+    def __init__(self, headers=None, pool_maxsize=POOL_MAXSIZE, timeout=DEFAULT_TIMEOUT,
+                 retry_policy=None, breaker=None, job=None):
+        super().__init__()
+        adapter = TimedHTTPAdapter(pool_connections=POOL_HOSTS,
+                                   pool_maxsize=max(int(pool_maxsize), 1))
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        self.headers["User-Agent"] = USER_AGENT
+        if headers:
+            self.headers.update(headers)
+        self.timeout = timeout
+        self.retry_policy = retry_policy
+        self.breaker = breaker
+        self.job = job
+        self.observers = [TELEMETRY.record]
+
+    def request(self, method, url, *args, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        record = RequestRecord(method, url, self.job)
+        try:
+            with record.active():
+                response = super().request(method, url, *args, **kwargs)
+        except Exception as e:
+            record.failed(e)
+            self._notify(record)
+            raise
+        record.track(response, self._notify, kwargs.get("stream", False))
+        return response
+
+    def _notify(self, record):
+        for observer in self.observers:
+            observer(record)
+
+    def fetch(self, url, **kwargs):
+        """
+        GET with retries and raise_for_status(); see forgehub.retry.get().
+        """
+        return retry.get(self, url, self.retry_policy, self.breaker, **kwargs)
+
+    def call(self, url, fn):
+        """
+        Run `fn()` - a complete request against `url`, body included - with retries.
+        """
+        return retry.call_with_retry(url, fn, self.retry_policy, self.breaker)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_client():
+    """
+    The process-wide HttpClient, created on first use. Scripts use this so all
+    their requests share one connection pool.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = HttpClient()
+        return _shared
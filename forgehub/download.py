@@ -0,0 +1,237 @@
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+
+from forgehub.client import shared_client
+from forgehub.telemetry import current_job, job_scope
+
+# Read sizes grow from MIN_READ_SIZE towards MAX_READ_SIZE while reads keep
+# completing faster than TARGET_READ_SECONDS, and shrink when they don't, so
+# fast links do few large reads and slow ones still report progress
+MIN_READ_SIZE = 64 * 1024
+MAX_READ_SIZE = 4 * 1024 * 1024
+TARGET_READ_SECONDS = 0.25
+PART_SUFFIX = ".part"
+# Ranged downloads: parallel connections, and the smallest range worth one
+RANGE_CONNECTIONS = 4
+MIN_RANGE_SIZE = 8 * 1024 * 1024
+
+
+class RangeNotSupported(ValueError):
+    """
+    The server answered a Range request with the whole body.
+    """
+
+
+def _preallocate(f, size):
+    """
+    Reserve `size` bytes for `f` up front so the file isn't grown write by write.
+    """
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+            return
+        except OSError:
+            pass  # e.g. not supported by the filesystem
+    f.truncate(size)
+
+
+def copy_response(response, f, expected=None):
+    """
+    Copy a streamed response body into file object `f`; returns bytes written.
+
+    The body is read straight from the raw response in adaptive sizes (see
+    MIN_READ_SIZE), so a fast link is copied in few large reads and writes
+    instead of many small chunks. Compressed bodies (Content-Encoding) go
+    through iter_content() so they're still decoded. Raises IOError if fewer
+    than `expected` bytes arrive.
+    """
+    written = 0
+    encoding = response.headers.get("Content-Encoding", "identity").lower()
+    if encoding not in ("", "identity"):
+        for chunk in response.iter_content(MAX_READ_SIZE):
+            f.write(chunk)
+            written += len(chunk)
+    else:
+        size = MIN_READ_SIZE
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = response.raw.read(size)
+            # Same translation iter_content() does, so callers see requests errors
+            except ProtocolError as e:
+                raise requests.exceptions.ChunkedEncodingError(e)
+            except ReadTimeoutError as e:
+                raise requests.exceptions.ConnectionError(e)
+            if not chunk:
+                break
+            f.write(chunk)
+            n = len(chunk)
+            written += n
+            if n == size and time.perf_counter() - start < TARGET_READ_SECONDS:
+                size = min(size * 2, MAX_READ_SIZE)
+            elif time.perf_counter() - start > TARGET_READ_SECONDS * 2:
+                size = max(size // 2, MIN_READ_SIZE)
+    if expected is not None and written < expected:
+        raise IOError(f"Incomplete download: {written}/{expected} bytes")
+    return written
+
+
+def save_response(response, path, preallocate=False):
+    """
+    Stream an already-open response into `path`, atomically: the body goes to
+    `path`.part, which only replaces `path` once it is complete. With
+    `preallocate` the full Content-Length is reserved on disk first.
+    Returns the number of bytes written.
+    """
+    length = response.headers.get("Content-Length")
+    expected = int(length) if length and length.isdigit() else None
+    if response.headers.get("Content-Encoding", "identity").lower() not in ("", "identity"):
+        expected = None  # Content-Length counts the compressed bytes
+
+    part_path = path + PART_SUFFIX
+    try:
+        with response, open(part_path, "wb") as f:
+            if preallocate and expected:
+                _preallocate(f, expected)
+            written = copy_response(response, f, expected)
+            # Drop any preallocated tail a short body didn't fill
+            f.truncate(written)
+        os.replace(part_path, path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    return written
+
+
+def download_file(url, path, client=None, preallocate=False, **kwargs):
+    """
+    GET `url` into `path` with the shared client's retries; each attempt
+    starts the file over. Extra keyword arguments go to client.get().
+    Returns the number of bytes written; raises on failure.
+    """
+    client = client or shared_client()
+
+    def attempt():
+        response = client.get(url, stream=True, **kwargs)
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+        return save_response(response, path, preallocate)
+
+    return client.call(url, attempt)
+
+
+class _CountingWriter:
+    """
+    File wrapper that remembers how many bytes reached the file, so a failed
+    range can resume from the last byte written.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.written = 0
+
+    def write(self, data):
+        n = self.f.write(data)
+        self.written += n
+        return n
+
+
+def probe_ranges(url, client=None, **kwargs):
+    """
+    Ask for the first byte of `url`. Returns the full size if the server
+    serves byte ranges of an uncompressed body, else None.
+    """
+    client = client or shared_client()
+    headers = dict(kwargs.pop("headers", None) or {}, Range="bytes=0-0")
+    try:
+        with client.get(url, stream=True, headers=headers, **kwargs) as response:
+            response.raise_for_status()
+            content_range = response.headers.get("Content-Range", "")
+            encoding = response.headers.get("Content-Encoding", "identity").lower()
+            if response.status_code == 206:
+                # Drain the single byte so the connection goes back to the pool
+                response.content
+    except Exception:
+        return None
+    match = re.match(r"bytes 0-0/(\d+)$", content_range.strip())
+    if response.status_code != 206 or not match or encoding not in ("", "identity"):
+        return None
+    return int(match.group(1))
+
+
+def _fetch_range(client, url, part_path, start, end, kwargs, job=None):
+    """
+    Fill bytes start..end (inclusive) of `part_path`. A failed attempt is
+    retried from the last byte it wrote, not from the start of the range.
+    Requests are attributed to telemetry job `job`.
+    """
+    done = 0
+    headers = dict(kwargs.get("headers") or {})
+    options = {k: v for k, v in kwargs.items() if k != "headers"}
+
+    def attempt():
+        nonlocal done
+        headers["Range"] = f"bytes={start + done}-{end}"
+        with client.get(url, stream=True, headers=headers, **options) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise RangeNotSupported(f"{url} ignored Range: HTTP {response.status_code}")
+            with open(part_path, "r+b") as f:
+                f.seek(start + done)
+                writer = _CountingWriter(f)
+                try:
+                    copy_response(response, writer, end - start + 1 - done)
+                finally:
+                    done += writer.written
+
+    with job_scope(job):
+        client.call(url, attempt)
+
+
+def download_ranged(url, path, client=None, connections=RANGE_CONNECTIONS, **kwargs):
+    """
+    Download `url` into `path` over up to `connections` parallel Range
+    requests, written straight into a preallocated `path`.part. Each range
+    resumes independently after a failure. Servers without byte-range support
+    (or files under 2 * MIN_RANGE_SIZE) fall back to a single download_file()
+    stream. Returns the number of bytes written; raises on failure.
+    """
+    client = client or shared_client()
+    size = probe_ranges(url, client, **kwargs) if connections > 1 else None
+    if not size or size < MIN_RANGE_SIZE * 2:
+        return download_file(url, path, client, preallocate=True, **kwargs)
+
+    parts = min(connections, size // MIN_RANGE_SIZE)
+    step = -(-size // parts)
+    ranges = [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+    print(f"[i] {size / (1024 * 1024):.1f} MB over {len(ranges)} connections: {url}")
+
+    part_path = path + PART_SUFFIX
+    try:
+        with open(part_path, "wb") as f:
+            _preallocate(f, size)
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            futures = [pool.submit(_fetch_range, client, url, part_path, start, end, kwargs,
+                                   current_job())
+                       for start, end in ranges]
+            for future in futures:
+                future.result()
+        os.replace(part_path, path)
+    except RangeNotSupported as e:
+        os.remove(part_path)
+        print(f"[!] {e}, falling back to a single stream.")
+        return download_file(url, path, client, preallocate=True, **kwargs)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    return size
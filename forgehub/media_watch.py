@@ -0,0 +1,100 @@
+import json
+import time
+
+# Request URLs that mean the player has started: manifests and progressive media
+MEDIA_PATTERNS = (".m3u8", ".mpd", ".mp4")
+IGNORED_SCHEMES = ("blob:", "data:")
+# Longest a single wait in the page lasts; the watch loop runs `on_tick` in between
+TICK_SECONDS = 1.0
+# CDP events carrying a request URL
+NETWORK_EVENTS = {
+    "Network.requestWillBeSent": "request",
+    "Network.responseReceived": "response",
+}
+
+# Resolves with the first resource entry (already loaded or loaded within
+# `wait` ms) whose URL contains one of `patterns`, else with null
+_OBSERVE_SCRIPT = """
+const [patterns, wait, done] = arguments;
+const matches = url => !url.startsWith("blob:") && !url.startsWith("data:")
+    && patterns.some(p => url.includes(p));
+const seen = performance.getEntriesByType("resource").find(e => matches(e.name));
+if (seen) return done(seen.name);
+let timer;
+const observer = new PerformanceObserver(list => {
+    const entry = list.getEntries().find(e => matches(e.name));
+    if (entry) {
+        observer.disconnect();
+        clearTimeout(timer);
+        done(entry.name);
+    }
+});
+observer.observe({type: "resource"});
+timer = setTimeout(() => { observer.disconnect(); done(null); }, wait);
+"""
+
+
+def enable_network_log(options):
+    """
+    Have ChromeDriver record CDP Network events in the "performance" log, which
+    wait_for_media() reads (it sees requests before they finish, and those of
+    cross-origin frames).
+    """
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return options
+
+
+def _matches(url, patterns):
+    return (url and not url.startswith(IGNORED_SCHEMES)
+            and any(pattern in url for pattern in patterns))
+
+
+def network_log_urls(driver):
+    """
+    Request URLs from the CDP Network events logged since the last call (the
+    log is drained). Raises if the driver wasn't set up with enable_network_log().
+    """
+    urls = []
+    for entry in driver.get_log("performance"):
+        message = json.loads(entry["message"])["message"]
+        field = NETWORK_EVENTS.get(message.get("method"))
+        if field:
+            urls.append(message["params"][field]["url"])
+    return urls
+
+
+def wait_for_media(driver, patterns=MEDIA_PATTERNS, timeout=60, on_tick=None):
+    """
+    Wait until the page requests a URL containing one of `patterns` and return
+    it, or None after `timeout` seconds.
+
+    Returns as soon as the request shows up: in the CDP network log when it's
+    enabled, otherwise through a PerformanceObserver in the page, which the
+    driver blocks on for up to TICK_SECONDS at a time. `on_tick` (e.g. saving
+    a snapshot) runs after each wait that saw nothing.
+    """
+    deadline = time.time() + timeout
+    network_log = True
+    while True:
+        if network_log:
+            try:
+                url = next((u for u in network_log_urls(driver) if _matches(u, patterns)), None)
+                if url:
+                    return url
+            except Exception:
+                network_log = False  # no "performance" log on this driver
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None
+        wait = min(TICK_SECONDS, remaining)
+        try:
+            driver.set_script_timeout(wait + 5)
+            url = driver.execute_async_script(_OBSERVE_SCRIPT, list(patterns), int(wait * 1000))
+            if url:
+                return url
+        except Exception:
+            time.sleep(wait)  # page navigating / script blocked; try again next tick
+
+        if on_tick is not None:
+            on_tick()
@@ -0,0 +1,195 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+# Responses worth another try: throttling, gateway and origin-down errors
+# (52x are Cloudflare's "origin unreachable" family)
+RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504, 520, 521, 522, 523, 524)
+# Consecutive timeouts / connection failures after which a host's circuit
+# opens, and for how long
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 60.0
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of sending a request to a host whose circuit is open.
+    """
+
+
+def is_retryable(exc):
+    """
+    True for failures another attempt may fix: timeouts, dropped connections,
+    truncated bodies and RETRY_STATUSES responses. 404s and friends are final.
+    """
+    if isinstance(exc, CircuitOpenError):
+        return False
+    if isinstance(exc, requests.exceptions.HTTPError):
+        return exc.response is not None and exc.response.status_code in RETRY_STATUSES
+    return isinstance(exc, (requests.exceptions.RequestException, OSError))
+
+
+def retry_after(exc):
+    """
+    Seconds asked for by a Retry-After header on the failed response, or None.
+    """
+    response = getattr(exc, "response", None)
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Up to `attempts` tries with exponential backoff and full jitter: the n-th
+    retry sleeps a random time in [0, backoff * 2**n], capped at `max_delay`.
+    A Retry-After header wins over the backoff, up to `max_retry_after`.
+    """
+
+    def __init__(self, attempts=4, backoff=1.0, max_delay=30.0, max_retry_after=120.0):
+        self.attempts = max(int(attempts), 1)
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt, exc):
+        asked = retry_after(exc)
+        if asked is not None:
+            return min(asked, self.max_retry_after)
+        return random.uniform(0, min(self.max_delay, self.backoff * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker. After `threshold` consecutive timeouts or
+    connection failures a host is cut off for `cooldown` seconds and requests
+    to it fail fast with CircuitOpenError. Once the cooldown ends a single trial request goes
+    through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = {}
+        self._open_until = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url):
+        return urlparse(url).netloc.lower()
+
+    def open_until(self, url):
+        """
+        time.monotonic() at which the host's circuit lets requests through again
+        (0 when it is closed).
+        """
+        with self._lock:
+            return self._open_until.get(self.host(url), 0.0)
+
+    def check(self, url):
+        host = self.host(url)
+        with self._lock:
+            until = self._open_until.get(host)
+            if until is None:
+                return
+            now = time.monotonic()
+            if now < until:
+                raise CircuitOpenError(f"Circuit open for {host}, "
+                                       f"retry in {until - now:.0f}s")
+            # Half-open: let this request probe the host, keep the rest out
+            self._open_until[host] = now + self.cooldown
+
+    def success(self, url):
+        host = self.host(url)
+        with self._lock:
+            self._failures.pop(host, None)
+            self._open_until.pop(host, None)
+
+    def failure(self, url):
+        host = self.host(url)
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if self._failures[host] >= self.threshold:
+                if host not in self._open_until:
+                    print(f"[!] {host}: {self._failures[host]} failures in a row, "
+                          f"pausing it for {self.cooldown:.0f}s.")
+                self._open_until[host] = time.monotonic() + self.cooldown
+
+
+# Shared by every download in the process, so all workers see a host go down
+DEFAULT_POLICY = RetryPolicy()
+BREAKER = CircuitBreaker()
+
+
+_attempts = threading.local()
+
+
+def current_attempt():
+    """
+    1-based number of the attempt call_with_retry() is making on this thread
+    (1 outside of it), e.g. so telemetry can count retries.
+    """
+    return getattr(_attempts, "number", 1)
+
+
+def call_with_retry(url, fn, policy=None, breaker=None):
+    """
+    Run `fn()` - one complete request against `url`, body included - under
+    `policy` and `breaker` (the shared defaults when None), and return its result.
+    `fn` should call raise_for_status() so HTTP errors can be classified.
+    The last error is re-raised once the attempts are used up.
+    """
+    policy = policy or DEFAULT_POLICY
+    breaker = BREAKER if breaker is None else breaker
+    outer = current_attempt()
+    try:
+        for attempt in range(policy.attempts):
+            breaker.check(url)
+            _attempts.number = attempt + 1
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                # Only an unreachable host counts against the circuit; a 503 or a
+                # dropped body means the server is up and another try may work
+                if isinstance(e, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+                    breaker.failure(url)
+                if attempt == policy.attempts - 1:
+                    raise
+                wait = policy.delay(attempt, e)
+                print(f"[!] {type(e).__name__} for {url}, retry {attempt + 1}/"
+                      f"{policy.attempts - 1} in {wait:.1f}s")
+                time.sleep(wait)
+                continue
+            breaker.success(url)
+            return result
+    finally:
+        _attempts.number = outer
+
+
+def get(session, url, policy=None, breaker=None, **kwargs):
+    """
+    GET `url` through `session` (module-level requests when None) with retries
+    and raise_for_status(). With stream=True only the status line is covered;
+    errors while reading the body are the caller's to retry.
+    """
+    def attempt():
+        response = (session or requests).get(url, **kwargs)
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
+        return response
+    return call_with_retry(url, attempt, policy, breaker)
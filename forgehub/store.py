@@ -0,0 +1,254 @@
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import threading
+
+from forgehub.client import shared_client
+from forgehub.download import PART_SUFFIX, download_ranged, save_response
+from forgehub.urls import url_key
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Inside the repository by default so hardlinks to the scripts' output
+# folders stay on one filesystem; FORGEHUB_STORE overrides it
+STORE_ROOT = os.environ.get("FORGEHUB_STORE", os.path.join(REPO_ROOT, ".media_store"))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaStore:
+    """
+    Content-addressed store: every downloaded body lives once under
+    objects/<sha256[:2]>/<sha256>, and an SQLite index maps URLs to digests
+    along with their ETag / Last-Modified. Output files are hardlinks into
+    the store (copies when linking isn't possible), so an asset costs disk
+    space once however many pages, runs or URLs refer to it.
+
+    Files made from a URL rather than downloaded from it (a merged HLS
+    stream, say) are indexed under the URL plus a `derived` label naming
+    how they were made.
+    """
+
+    def __init__(self, root=STORE_ROOT):
+        self.root = root
+        self.objects = os.path.join(root, "objects")
+        self.tmp = os.path.join(root, "tmp")
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.tmp, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS urls (key TEXT PRIMARY KEY, digest TEXT NOT NULL, "
+                         "size INTEGER, etag TEXT, last_modified TEXT, content_type TEXT, "
+                         "fetched REAL)")
+        self._db.commit()
+
+    def object_path(self, digest):
+        return os.path.join(self.objects, digest[:2], digest)
+
+    def _key(self, url, derived=None):
+        return url_key(url) if derived is None else f"{url_key(url)}#{derived}"
+
+    def lookup(self, url, derived=None):
+        """
+        Index entry {"digest", "size", "etag", "last_modified", "content_type"}
+        for a URL (or a `derived` output of it) whose object is still in the
+        store, else None. An object whose size no longer matches (changed
+        through a link to it) is dropped along with every entry naming it.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT digest, size, etag, last_modified, content_type "
+                                   "FROM urls WHERE key = ?", (self._key(url, derived),)).fetchone()
+        if row is None:
+            return None
+        object_path = self.object_path(row[0])
+        try:
+            size = os.path.getsize(object_path)
+        except OSError:
+            size = None
+        if size is None or (row[1] is not None and size != row[1]):
+            with self._lock:
+                self._db.execute("DELETE FROM urls WHERE digest = ?", (row[0],))
+                self._db.commit()
+            if size is not None:
+                os.remove(object_path)
+            return None
+        return dict(zip(("digest", "size", "etag", "last_modified", "content_type"), row))
+
+    def temp_path(self):
+        """
+        A fresh path inside the store (same filesystem as the objects) to download into.
+        """
+        fd, path = tempfile.mkstemp(dir=self.tmp)
+        os.close(fd)
+        return path
+
+    def _index(self, url, digest, size, headers, derived=None):
+        headers = headers or {}
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (self._key(url, derived), digest, size, headers.get("ETag"),
+                              headers.get("Last-Modified"), headers.get("Content-Type"),
+                              time.time()))
+            self._db.commit()
+
+    def add(self, url, src_path, headers=None):
+        """
+        Move a downloaded file into the store and index it under `url` with the
+        validators from response `headers`. A body already stored (any URL) is
+        dropped in favour of the existing object. Returns (digest, is_new).
+        """
+        digest = sha256_file(src_path)
+        size = os.path.getsize(src_path)
+        object_path = self.object_path(digest)
+        is_new = not os.path.exists(object_path)
+        if is_new:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.replace(src_path, object_path)
+        else:
+            os.remove(src_path)
+        self._index(url, digest, size, headers)
+        return digest, is_new
+
+    def adopt(self, url, path, derived=None, content_type=None):
+        """
+        Index a finished file already at `path` (e.g. a merged video) under
+        `url` and `derived` (see lookup()), with `content_type` if given,
+        leaving `path` as a hardlink into the store. Returns (digest, is_new).
+        """
+        digest = sha256_file(path)
+        object_path = self.object_path(digest)
+        is_new = not os.path.exists(object_path)
+        if is_new:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            try:
+                os.link(path, object_path)
+            except OSError:
+                shutil.copyfile(path, object_path)
+        else:
+            self.materialize(digest, path)
+        headers = {"Content-Type": content_type} if content_type else None
+        self._index(url, digest, os.path.getsize(path), headers, derived)
+        return digest, is_new
+
+    def materialize(self, digest, path):
+        """
+        Make `path` a hardlink to the stored object (a copy across filesystems).
+        """
+        object_path = self.object_path(digest)
+        if os.path.exists(path) and os.path.samefile(path, object_path):
+            return path
+        part_path = path + PART_SUFFIX
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        try:
+            os.link(object_path, part_path)
+        except OSError:
+            shutil.copyfile(object_path, part_path)
+        os.replace(part_path, path)
+        return path
+
+    def save(self, url, response, path):
+        """
+        Store an already-open streamed response for `url` and link it at `path`.
+        Returns (digest, is_new).
+        """
+        tmp_path = self.temp_path()
+        try:
+            save_response(response, tmp_path)
+            digest, is_new = self.add(url, tmp_path, response.headers)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.materialize(digest, path)
+        return digest, is_new
+
+    def _open_once(self, url, entry, client, kwargs):
+        if entry and not (entry["etag"] or entry["last_modified"]):
+            return None
+        headers = dict(kwargs.get("headers") or {})
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        options = {k: v for k, v in kwargs.items() if k != "headers"}
+        response = client.get(url, stream=True, headers=headers, **options)
+        if response.status_code == 304:
+            response.close()
+            return None
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+        return response
+
+    def open(self, url, client=None, **kwargs):
+        """
+        Start fetching `url`, revalidating what the store already holds for it.
+        Returns (response, entry): `response` is an open streamed response to
+        pass to save(), or None when the stored `entry` is current - it has no
+        validators to check (stored media is taken as immutable) or the server
+        answered a conditional GET with 304. Extra arguments go to client.get().
+        """
+        client = client or shared_client()
+        entry = self.lookup(url)
+        return client.call(url, lambda: self._open_once(url, entry, client, kwargs)), entry
+
+    def fetch(self, url, path, client=None, ranged=False, **kwargs):
+        """
+        Put the body of `url` at `path` through the store. Returns how:
+        - "cached": known URL without validators, linked without a request
+        - "not-modified": conditional GET answered 304, linked
+        - "duplicate": downloaded, but the content was already stored
+        - "downloaded": new content
+        `ranged` uses download_ranged() for first-time downloads of large files.
+        Extra keyword arguments go to client.get(). Raises on failure.
+        """
+        client = client or shared_client()
+        entry = self.lookup(url)
+
+        if entry is None and ranged:
+            tmp_path = self.temp_path()
+            try:
+                download_ranged(url, tmp_path, client, **kwargs)
+                digest, is_new = self.add(url, tmp_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            self.materialize(digest, path)
+            return "downloaded" if is_new else "duplicate"
+
+        def attempt():
+            # The whole body is inside the retry, so a dropped connection starts over
+            response = self._open_once(url, entry, client, kwargs)
+            return None if response is None else self.save(url, response, path)
+
+        stored = client.call(url, attempt)
+        if stored is None:
+            self.materialize(entry["digest"], path)
+            return "not-modified" if entry["etag"] or entry["last_modified"] else "cached"
+        return "downloaded" if stored[1] else "duplicate"
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_store():
+    """
+    The process-wide MediaStore at STORE_ROOT, opened on first use.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = MediaStore()
+        return _shared
@@ -0,0 +1,443 @@
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from forgehub.retry import current_attempt
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Phases of a request: name resolution, TCP (+ TLS) setup, waiting for the
+# response headers, reading the body, and all of it
+PHASES = ("dns", "connect", "ttfb", "transfer", "total")
+
+_local = threading.local()
+
+
+def _active_record():
+    return getattr(_local, "record", None)
+
+
+class RequestRecord:
+    """
+    Timings and outcome of one HTTP request. dns / connect stay 0 when a
+    pooled keep-alive connection was reused.
+    """
+
+    def __init__(self, method, url, job=None):
+        self.method = method
+        self.url = url
+        parts = urlsplit(url)
+        self.host = parts.netloc.lower() or parts.scheme  # e.g. "data" for data: URLs
+        self.job = current_job() or job
+        self.attempt = current_attempt()
+        self.status = None
+        self.error = None
+        self.bytes = 0
+        self.dns = self.connect = self.ttfb = self.transfer = self.total = 0.0
+        self._start = time.perf_counter()
+        self._headers_at = None
+        self._connect_start = self._resolved_at = None
+
+    @contextmanager
+    def active(self):
+        """
+        Make this the record that connections opened on this thread report to.
+        """
+        previous = _active_record()
+        _local.record = self
+        try:
+            yield self
+        finally:
+            _local.record = previous
+
+    def failed(self, error):
+        self.error = type(error).__name__
+        self.total = time.perf_counter() - self._start
+
+    def track(self, response, done, streamed=False):
+        """
+        Take the status and time to first byte from `response`, then call
+        `done(record)` once its body has been read or it is closed - right
+        away unless it was requested with stream=True (`streamed`).
+        """
+        self.status = response.status_code
+        self._headers_at = self._start + response.elapsed.total_seconds()
+        self.ttfb = max(response.elapsed.total_seconds() - self.dns - self.connect, 0.0)
+
+        def finish():
+            end = time.perf_counter()
+            self.transfer = max(end - self._headers_at, 0.0)
+            self.total = end - self._start
+            tell = getattr(response.raw, "tell", None)
+            self.bytes = tell() if tell else len(response.content or b"")
+            done(self)
+
+        if not streamed or not hasattr(response.raw, "release_conn"):
+            finish()
+            return
+        finished = False
+
+        def finish_once():
+            nonlocal finished
+            if not finished:
+                finished = True
+                finish()
+
+        response.raw = _TrackedBody(response.raw, finish_once)
+
+
+class _TrackedBody:
+    """
+    Stands in for a streamed response's urllib3 body (response.raw) and calls
+    `on_done` when it has been read to the end or is released/closed. Uses
+    only public HTTPResponse methods; everything else is passed through.
+
+    A close from inside a read (urllib3 hands the connection back as the
+    last read drains it) is left to that read, whose bytes only count once
+    it returns.
+    """
+
+    def __init__(self, raw, on_done):
+        self._raw = raw
+        self._on_done = on_done
+        self._reading = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            super().__setattr__(name, value)
+        else:
+            setattr(self._raw, name, value)  # e.g. decode_content
+
+    def read(self, *args, **kwargs):
+        self._reading = True
+        try:
+            return self._raw.read(*args, **kwargs)
+        finally:
+            self._reading = False
+            if self._raw.closed:
+                self._on_done()
+
+    def stream(self, *args, **kwargs):
+        chunks = self._raw.stream(*args, **kwargs)
+        while True:
+            self._reading = True
+            try:
+                chunk = next(chunks, None)
+            finally:
+                self._reading = False
+            if chunk is None:
+                break
+            yield chunk
+        self._on_done()
+
+    def release_conn(self):
+        if not self._reading:
+            self._on_done()
+        self._raw.release_conn()
+
+    def close(self):
+        if not self._reading:
+            self._on_done()
+        self._raw.close()
+
+
+def current_job():
+    """
+    The job_scope() label active on this thread, if any.
+    """
+    return getattr(_local, "job", None)
+
+
+@contextmanager
+def job_scope(name):
+    """
+    Attribute requests made on this thread inside the block to job `name`.
+    """
+    previous = current_job()
+    _local.job = name
+    try:
+        yield
+    finally:
+        _local.job = previous
+
+
+class _MarkResolved(list):
+    """
+    Socket options that note, on the RequestRecord of a connection being set
+    up, when they are applied: urllib3 sets them on each new socket right
+    after name resolution and before connecting, which splits dns from
+    connect without touching urllib3 internals.
+    """
+
+    def __iter__(self):
+        record = _active_record()
+        if record is not None and record._connect_start is not None \
+                and record._resolved_at is None:
+            record._resolved_at = time.perf_counter()
+        return super().__iter__()
+
+
+class _TimedConnection:
+    """
+    Connection mixin that reports name resolution and connection setup
+    (TCP, plus TLS for https) to the active RequestRecord.
+    """
+
+    def connect(self):
+        record = _active_record()
+        if record is None:
+            return super().connect()
+        start = record._connect_start = time.perf_counter()
+        record._resolved_at = None
+        try:
+            super().connect()
+        finally:
+            end = time.perf_counter()
+            # Without a mark the resolution failed (or took all the time)
+            resolved = record._resolved_at or end
+            record.dns += resolved - start
+            record.connect += end - resolved
+            record._connect_start = record._resolved_at = None
+
+
+class _TimedHTTPConnection(_TimedConnection, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnection, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connections report DNS / connect timings to RequestRecords.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault("socket_options", _MarkResolved(HTTPConnection.default_socket_options))
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool,
+                                                   "https": _TimedHTTPSConnectionPool}
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        proxy_kwargs.setdefault("socket_options",
+                                _MarkResolved(HTTPConnection.default_socket_options))
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram (Prometheus style: `buckets` are upper bounds).
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding quantile `q` (None when empty).
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def cumulative(self):
+        """
+        [(upper bound, observations <= bound)], ending with +Inf.
+        """
+        total = 0
+        result = []
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            total += n
+            result.append((bound, total))
+        return result
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "p50": _json_bound(self.quantile(0.5)),
+            "p90": _json_bound(self.quantile(0.9)),
+            "p99": _json_bound(self.quantile(0.99)),
+            "buckets": {_format_bound(bound): n for bound, n in self.cumulative()},
+        }
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def _json_bound(bound):
+    return "+Inf" if bound == float("inf") else bound
+
+
+class _Series:
+    """
+    Aggregate of the requests for one host or one job.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.statuses = {}
+        self.phases = {phase: Histogram() for phase in PHASES}
+
+    def add(self, record):
+        self.requests += 1
+        self.bytes += record.bytes
+        if record.attempt > 1:
+            self.retries += 1
+        if record.error is not None or (record.status or 0) >= 400:
+            self.errors += 1
+        status = str(record.status) if record.status is not None else record.error
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        for phase in PHASES:
+            # A request that got no response never reached ttfb / transfer
+            if record.status is not None or phase in ("dns", "connect", "total"):
+                self.phases[phase].observe(getattr(record, phase))
+
+    def as_dict(self):
+        transfer = self.phases["transfer"].sum
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "throughput_bytes_per_second": round(self.bytes / transfer) if transfer else None,
+            "statuses": dict(self.statuses),
+            "seconds": {phase: h.as_dict() for phase, h in self.phases.items()},
+        }
+
+
+def _labels(**labels):
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for v in labels.values())
+    return ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped))
+
+
+class Telemetry:
+    """
+    Collects RequestRecords into per-host and per-job series and exports them
+    as a JSON summary and a Prometheus text-format file.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hosts = {}
+        self.jobs = {}
+        self.started = time.time()
+
+    def record(self, record):
+        with self._lock:
+            self.hosts.setdefault(record.host, _Series()).add(record)
+            if record.job is not None:
+                self.jobs.setdefault(str(record.job), _Series()).add(record)
+
+    def summary(self):
+        with self._lock:
+            return {
+                "started": self.started,
+                "duration": round(time.time() - self.started, 3),
+                "hosts": {host: s.as_dict() for host, s in sorted(self.hosts.items())},
+                "jobs": {job: s.as_dict() for job, s in sorted(self.jobs.items())},
+            }
+
+    def prometheus(self):
+        """
+        The aggregate in Prometheus text exposition format.
+        """
+        lines = []
+        counters = [
+            ("forgehub_request_errors_total", "Requests that failed or got a 4xx/5xx.",
+             lambda s: s.errors),
+            ("forgehub_request_retries_total", "Requests that were retries.", lambda s: s.retries),
+            ("forgehub_response_bytes_total", "Response bytes read.", lambda s: s.bytes),
+        ]
+        with self._lock:
+            series = ([("host", k, s) for k, s in sorted(self.hosts.items())] +
+                      [("download", k, s) for k, s in sorted(self.jobs.items())])
+
+            name = "forgehub_requests_total"
+            lines += [f"# HELP {name} HTTP requests made, by status.", f"# TYPE {name} counter"]
+            for label, key, s in series:
+                for status, n in sorted(s.statuses.items()):
+                    lines.append(f"{name}{{{_labels(**{label: key}, status=status)}}} {n}")
+            for name, help_text, value in counters:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for label, key, s in series:
+                    lines.append(f"{name}{{{_labels(**{label: key})}}} {value(s)}")
+
+            name = "forgehub_request_duration_seconds"
+            lines.append(f"# HELP {name} Time spent per request phase.")
+            lines.append(f"# TYPE {name} histogram")
+            for label, key, s in series:
+                for phase, h in s.phases.items():
+                    base = _labels(**{label: key}, phase=phase)
+                    for bound, n in h.cumulative():
+                        lines.append(f'{name}_bucket{{{base},le="{_format_bound(bound)}"}} {n}')
+                    lines.append(f"{name}_sum{{{base}}} {h.sum:.6f}")
+                    lines.append(f"{name}_count{{{base}}} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, prefix):
+        """
+        Write `prefix`.json and `prefix`.prom and print a per-host summary.
+        """
+        summary = self.summary()
+        with open(prefix + ".json", "w") as f:
+            json.dump(summary, f, indent=2)
+        with open(prefix + ".prom", "w") as f:
+            f.write(self.prometheus())
+
+        for host, s in summary["hosts"].items():
+            seconds = s["seconds"]
+            rate = s["throughput_bytes_per_second"]
+            print(f"[i] {host}: {s['requests']} requests, {s['errors']} errors, "
+                  f"{s['retries']} retries, TTFB p50 {_ms(seconds['ttfb']['p50'])}, "
+                  f"total p90 {_ms(seconds['total']['p90'])}"
+                  + (f", {rate / (1024 * 1024):.2f} MB/s" if rate else ""))
+        print(f"[i] Telemetry written to {prefix}.json / {prefix}.prom")
+
+
+def _ms(seconds):
+    if seconds is None:
+        return "-"
+    return f"> {LATENCY_BUCKETS[-1]:g}s" if seconds == "+Inf" else f"<= {seconds * 1000:g} ms"
+
+
+# Every HttpClient reports here; scripts call TELEMETRY.export() when done
+TELEMETRY = Telemetry()
@@ -0,0 +1,60 @@
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonical_url(url):
+    """
+    `url` with a lowercase scheme and host, no default port, no fragment and
+    its query parameters in sorted order - the one form equivalent URLs share.
+    Query values keep their original encoding. Unparseable URLs come back as-is.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc
+    if parts.hostname:
+        host = parts.hostname
+        netloc = f"[{host}]" if ":" in host else host
+        if port and port != DEFAULT_PORTS.get(scheme):
+            netloc += f":{port}"
+        userinfo = parts.netloc.rpartition("@")[0]
+        if userinfo:
+            netloc = f"{userinfo}@{netloc}"
+    path = parts.path or ("/" if netloc else "")
+    query = "&".join(sorted(p for p in parts.query.split("&") if p))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def url_key(url):
+    """
+    Key for grouping URLs: the canonical URL without its scheme, so http://
+    and https:// copies of a resource match.
+    """
+    canonical = canonical_url(url)
+    return canonical.partition("://")[2] or canonical.lstrip("/")
+
+
+def dedupe_urls(urls):
+    """
+    Group equivalent URLs (same url_key()), keeping first-seen order.
+    Returns (groups, removed): `groups` maps the URL to use for each group -
+    the canonical https:// variant if one was seen, else the first one's - to
+    the list of raw URLs it stands for; `removed` is how many URLs were
+    dropped as duplicates.
+    """
+    by_key = {}
+    total = 0
+    for url in urls:
+        total += 1
+        by_key.setdefault(url_key(url), []).append(url)
+
+    groups = {}
+    for variants in by_key.values():
+        https = [u for u in variants if urlsplit(u.strip()).scheme.lower() == "https"]
+        groups[canonical_url((https or variants)[0])] = variants
+    return groups, total - len(groups)
@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import tempfile
+import importlib
+import contextlib
+import statistics
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from hls_bench_server import SyntheticHLSServer
+
+# Offline downloader benchmark: every mode below downloads every scenario
+# from a local SyntheticHLSServer, each run in a fresh process so peak RSS
+# and disk writes are its own.
+
+# Stream shape shared by all scenarios (a scenario can override any of these)
+SEGMENTS = 120
+SEGMENT_SIZE = 512 * 1024
+SCENARIOS = [
+    {"name": "ts"},
+    {"name": "ts-latency-50ms", "latency": 0.05},
+    {"name": "ts-errors-5%", "error_rate": 0.05},
+    {"name": "fmp4", "container": "fmp4"},
+    {"name": "aes-128", "encrypted": True},
+    {"name": "byterange", "byterange": True},
+]
+# Downloader configurations: (label, script module, download_hls_stream() options).
+# Add new concurrency / output modes here to compare them with the existing ones.
+# "segments" (the scripts' default) and "pipe" remux through ffmpeg; their
+# output is checked against the expected stream packet by packet (see _media_hash).
+MODES = [
+    ("html-segments-c8", "download_m3u8_videos_from_html", {"output_mode": "segments", "concurrency": 8}),
+    ("html-pipe-c8", "download_m3u8_videos_from_html", {"output_mode": "pipe", "concurrency": 8}),
+    ("direct-segments-c8", "download_m3u8_directly", {"output_mode": "segments", "concurrency": 8}),
+    ("html-stream-c8", "download_m3u8_videos_from_html", {"output_mode": "stream", "concurrency": 8}),
+    ("html-stream-c16", "download_m3u8_videos_from_html", {"output_mode": "stream", "concurrency": 16}),
+    ("direct-stream-c8", "download_m3u8_directly", {"output_mode": "stream", "concurrency": 8}),
+]
+# Runs per (scenario, mode); the median run by time is reported
+REPEATS = 1
+RESULTS_FILE = "benchmark_results.json"
+
+
+def _peak_rss():
+    """
+    Peak resident set size of this process so far, in bytes (None if unknown).
+    """
+    # VmHWM starts over at exec; ru_maxrss on Linux can carry the parent's peak
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _bytes_written():
+    """
+    Bytes this process has caused to be written to storage (Linux), else None.
+    """
+    try:
+        with open("/proc/self/io") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines() if line)
+        return int(counters["write_bytes"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _media_hash(path):
+    """
+    SHA-256 of every stream's packet data in a media file, whatever its
+    container (None if ffmpeg can't read it): equal for a remux of the same media.
+    """
+    result = subprocess.run(["ffmpeg", "-loglevel", "error", "-i", path, "-map", "0",
+                             "-c", "copy", "-f", "streamhash", "-hash", "sha256", "-"],
+                            capture_output=True, text=True)
+    return result.stdout if result.returncode == 0 and result.stdout else None
+
+
+def _verify(server, output, workdir):
+    """
+    Whether `output` holds the stream the server sent: byte for byte, or for
+    a remuxed (.mp4) output the same media packets.
+    """
+    if not output or not os.path.exists(output):
+        return False
+    if _sha256_file(output) == server.expected_sha256():
+        return True
+    if not server.playable:
+        return False
+    expected = os.path.join(workdir, "expected.ts")
+    server.write_expected(expected)
+    media = _media_hash(output)
+    return media is not None and media == _media_hash(expected)
+
+
+def _run_download(module_name, options, url, workdir):
+    """
+    Child process: download `url` with `module_name`.download_hls_stream into
+    `workdir` and measure it. The downloader's own output is discarded.
+    """
+    os.chdir(workdir)
+    # A media store of its own, so no run is served from an earlier one's output
+    os.environ["FORGEHUB_STORE"] = os.path.join(workdir, ".media_store")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        module = importlib.import_module(module_name)
+        module.OUTPUT_FOLDER = workdir
+        rss_before = _peak_rss()
+        written_before = _bytes_written()
+        start = time.perf_counter()
+        output = module.download_hls_stream(url, "bench", **options)
+        elapsed = time.perf_counter() - start
+    written = _bytes_written()
+    peak_rss = _peak_rss()
+    return {
+        "elapsed": elapsed,
+        "output": output,
+        "peak_rss": peak_rss,
+        "rss_growth": peak_rss - rss_before if rss_before is not None else None,
+        "disk_written": written - written_before if written is not None else None,
+    }
+
+
+def run_case(scenario, label, module_name, options):
+    """
+    Serve `scenario` locally and download it once with one mode; returns the measurements.
+    """
+    settings = {"segments": SEGMENTS, "segment_size": SEGMENT_SIZE}
+    settings.update({k: v for k, v in scenario.items() if k != "name"})
+    with SyntheticHLSServer(**settings) as server, \
+            tempfile.TemporaryDirectory(prefix="hls_bench_") as workdir:
+        spawn = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            result = pool.submit(_run_download, module_name, options, server.url, workdir).result()
+
+        output = result.pop("output")
+        ok = _verify(server, output, workdir)
+        payload = server.expected_size()
+        elapsed = result["elapsed"]
+        result.update({
+            "scenario": scenario["name"],
+            "mode": label,
+            "ok": ok,
+            "segments": server.segments,
+            "payload_bytes": payload,
+            "segments_per_second": server.segments / elapsed,
+            "mb_per_second": payload / (1024 * 1024) / elapsed,
+            "server": dict(server.stats),
+        })
+        return result
+
+
+def _mb(value):
+    return "-" if value is None else f"{value / (1024 * 1024):.1f}"
+
+
+def main():
+    results = []
+    print(f"[i] {len(SCENARIOS)} scenarios x {len(MODES)} modes, {SEGMENTS} segments of "
+          f"{SEGMENT_SIZE // 1024} KiB, {REPEATS} run(s) each")
+    print(f"{'scenario':<18}{'mode':<20}{'seg/s':>8}{'MB/s':>8}{'peak RSS':>10}"
+          f"{'+RSS':>8}{'written':>9}{'requests':>10}  ok")
+    for scenario in SCENARIOS:
+        for label, module_name, options in MODES:
+            runs = [run_case(scenario, label, module_name, options) for _ in range(REPEATS)]
+            runs.sort(key=lambda run: run["elapsed"])
+            result = runs[len(runs) // 2]
+            result["runs"] = [run["elapsed"] for run in runs]
+            results.append(result)
+            print(f"{scenario['name']:<18}{label:<20}{result['segments_per_second']:>8.1f}"
+                  f"{result['mb_per_second']:>8.1f}{_mb(result['peak_rss']):>10}"
+                  f"{_mb(result['rss_growth']):>8}{_mb(result['disk_written']):>9}"
+                  f"{result['server']['requests']:>10}  {'✓' if result['ok'] else '✗'}")
+
+    with open(RESULTS_FILE, "w") as f:
+        json.dump({"segments": SEGMENTS, "segment_size": SEGMENT_SIZE, "repeats": REPEATS,
+                   "results": results}, f, indent=2)
+    failed = [r for r in results if not r["ok"]]
+    if failed:
+        print(f"[!] {len(failed)} runs produced wrong or missing output.")
+    if REPEATS > 1:
+        spread = max(statistics.pstdev(r["runs"]) / statistics.mean(r["runs"]) for r in results)
+        print(f"[i] Largest run-to-run spread: {spread:.0%} of the mean time")
+    print(f"[i] Results written to {RESULTS_FILE} (sizes above in MB)")
+
+
+if __name__ == "__main__":
+    main()
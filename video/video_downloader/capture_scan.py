@@ -0,0 +1,344 @@
+import os
+import re
+import json
+import mmap
+import html
+import sqlite3
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bs4 import BeautifulSoup
+
+from forgehub.captures import MANIFEST, CaptureStore
+
+# Media references looked for in browser captures:
+#   m3u8       - absolute .m3u8 URLs anywhere (text, scripts, attributes, JSON)
+#   mp4        - absolute .mp4 URLs anywhere
+#   video_src  - `video.src = "...mp4..."` assignments in scripts
+#   video_tag  - src of <video> elements
+#   source_tag - src of <source> elements
+MEDIA_KINDS = ("m3u8", "mp4", "video_src", "video_tag", "source_tag")
+# The single pass over a capture only looks for these short anchors; each hit
+# is then expanded to the surrounding URL / tag / assignment. One alternation
+# of the full patterns would be several times slower, as re can't skip ahead
+# to a literal prefix then.
+ANCHOR = re.compile(rb'\.m3u8|\.mp4|video\.src\s*=|<(?:[vV][iI][dD][eE][oO]|[sS][oO][uU][rR][cC][eE])\b[^>]*>')
+M3U8_URL = re.compile(r'https?://[^\s"\'<>]+\.m3u8')
+MP4_URL = re.compile(r'https?://[^\s"\'<>]+\.mp4[^\s"\'<>]*')
+VIDEO_SRC = re.compile(r'video\.src\s*=\s*[\'"]([^\'"]+\.mp4[^\']*)[\'"]')
+VIDEO_SRC_BYTES = re.compile(VIDEO_SRC.pattern.encode())
+TAG_SRC = re.compile(rb'\s[sS][rR][cC]\s*=\s*[\'"]([^\'"]+)[\'"]')
+# Characters ending a bare URL, and how far from an anchor its start is looked for
+URL_DELIMITERS = (b" ", b"\t", b"\n", b"\r", b"\f", b"\v", b'"', b"'", b"<", b">")
+MAX_URL_LENGTH = 4096
+# Bytes hinting at media the fast path may have missed (unquoted attributes,
+# entity-encoded URLs, ...); only files containing them get a full parse
+FALLBACK_HINTS = (b".m3u8", b"<video", b"<source", b"video.src")
+# Sources a downloader can't use
+IGNORED_SCHEMES = ("blob:", "data:", "javascript:")
+# Per-folder record of what each capture yielded (see CaptureIndex); bump
+# SCAN_VERSION whenever the extraction above changes so old entries are redone
+INDEX_FILE = ".capture_index.sqlite"
+SCAN_VERSION = 1
+INDEX_COMMIT_EVERY = 100
+# Processes scan_folder() spreads new / changed captures over
+DEFAULT_SCAN_WORKERS = os.cpu_count() or 1
+
+
+def _empty_result():
+    return {kind: [] for kind in MEDIA_KINDS}
+
+
+def _add(found, kind, url):
+    url = url.strip()
+    if url and not url.lower().startswith(IGNORED_SCHEMES) and url not in found[kind]:
+        found[kind].append(url)
+
+
+def _add_urls(found, text):
+    for url in M3U8_URL.findall(text):
+        _add(found, "m3u8", url)
+    for url in MP4_URL.findall(text):
+        _add(found, "mp4", url)
+
+
+def _text(raw):
+    # Captured bytes as text, with HTML entities (&amp; in attributes) decoded
+    return html.unescape(raw.decode("utf-8", "ignore"))
+
+
+def _token_bounds(data, pos):
+    # Start and end of the run of non-delimiter bytes around `pos`
+    lo = max(pos - MAX_URL_LENGTH, 0)
+    before = data[lo:pos]
+    after = data[pos:pos + MAX_URL_LENGTH]
+    start = lo + max(before.rfind(d) for d in URL_DELIMITERS) + 1
+    ends = [i for i in (after.find(d) for d in URL_DELIMITERS) if i != -1]
+    return start, pos + (min(ends) if ends else len(after))
+
+
+def scan_bytes(data):
+    """
+    Media URLs in an HTML capture's raw bytes (bytes or mmap), by kind
+    (see MEDIA_KINDS), each list in first-seen order without repeats.
+    """
+    found = _empty_result()
+    token_end = 0
+    for match in ANCHOR.finditer(data):
+        anchor = match.group()
+        if anchor.startswith(b"."):
+            if match.start() < token_end:
+                continue  # same URL-like run as the previous hit
+            token_start, token_end = _token_bounds(data, match.start())
+            _add_urls(found, _text(data[token_start:token_end]))
+        elif anchor.startswith(b"video"):
+            assignment = VIDEO_SRC_BYTES.match(data, match.start(), match.start() + MAX_URL_LENGTH)
+            if assignment:
+                _add(found, "video_src", _text(assignment.group(1)))
+        else:
+            src = TAG_SRC.search(anchor)
+            if src:
+                kind = "video_tag" if anchor[1:2] in b"vV" else "source_tag"
+                _add(found, kind, _text(src.group(1)))
+            # The tag swallowed any URL anchors inside it (other attributes too)
+            _add_urls(found, _text(anchor))
+    return found
+
+
+def parse_capture(text):
+    """
+    Slow path: the same URLs from a full BeautifulSoup parse (decoded text,
+    <script> bodies and <video>/<source> attributes).
+    """
+    found = _empty_result()
+    soup = BeautifulSoup(text, "html.parser")
+    chunks = [soup.get_text()] + [script.string for script in soup.find_all("script")
+                                  if script.string]
+    for chunk in chunks:
+        _add_urls(found, chunk)
+        for url in VIDEO_SRC.findall(chunk):
+            _add(found, "video_src", url)
+    for tag in ("video", "source"):
+        for element in soup.find_all(tag, src=True):
+            _add(found, f"{tag}_tag", element["src"])
+            _add_urls(found, element["src"])
+    return found
+
+
+def scan_data(data):
+    """
+    Media URLs in a capture's bytes, by kind (see MEDIA_KINDS): one scan_bytes()
+    pass, and parse_capture() only when that finds nothing although the data
+    has FALLBACK_HINTS.
+    """
+    found = scan_bytes(data)
+    if any(found.values()) or not any(data.find(hint) != -1 for hint in FALLBACK_HINTS):
+        return found
+    return parse_capture(data[:].decode("utf-8", "ignore"))
+
+
+def scan_capture(file_path, digest=None):
+    """
+    Media URLs in one capture file, by kind (see MEDIA_KINDS).
+
+    The file is memory-mapped and goes through scan_data(). A hashlib object
+    passed as `digest` is fed the file's bytes.
+    """
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return _empty_result()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if digest is not None:
+                digest.update(data)
+            return scan_data(data)
+
+
+def _scan_file(path):
+    # Worker side of scan_folder(): only the URL lists and the hash travel back
+    digest = hashlib.sha256()
+    found = scan_capture(path, digest)
+    return found, digest.hexdigest()
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_key(name, sha256):
+    # Index row name of a CaptureStore snapshot: snapshot names are per-second
+    # timestamps, so two snapshots saved within one second share a name
+    return f"{name}@{sha256}"
+
+
+class CaptureIndex:
+    """
+    SQLite record, kept in the capture folder, of the URLs extracted from each
+    capture along with the file's size, mtime and sha256. A file whose size and
+    mtime are unchanged is not read again; one that was only touched (same
+    hash) isn't rescanned either. `scanned` / `reused` count both outcomes.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.scanned = 0
+        self.reused = 0
+        self._pending = 0
+        self._db = sqlite3.connect(os.path.join(folder, INDEX_FILE))
+        self._db.execute("CREATE TABLE IF NOT EXISTS captures (name TEXT PRIMARY KEY, "
+                         "size INTEGER, mtime_ns INTEGER, sha256 TEXT, version INTEGER, "
+                         "urls TEXT)")
+        self._db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def lookup(self, file_name):
+        """
+        (result, stat) for a file in the folder: its recorded scan_capture()
+        result if the file hasn't changed since (else None), and its os.stat()
+        to pass to record() after scanning it.
+        """
+        path = os.path.join(self.folder, file_name)
+        st = os.stat(path)
+        row = self._db.execute("SELECT size, mtime_ns, sha256, version, urls FROM captures "
+                               "WHERE name = ?", (file_name,)).fetchone()
+        if row and row[3] == SCAN_VERSION:
+            if (row[0], row[1]) == (st.st_size, st.st_mtime_ns):
+                self.reused += 1
+                return json.loads(row[4]), st
+            if row[0] == st.st_size and row[2] == _sha256_file(path):
+                self._write(file_name, st, row[2], row[4])
+                self.reused += 1
+                return json.loads(row[4]), st
+        return None, st
+
+    def lookup_snapshot(self, name, sha256):
+        """
+        Recorded result for a CaptureStore snapshot with this content, or None.
+        """
+        row = self._db.execute("SELECT urls FROM captures WHERE name = ? AND version = ?",
+                               (snapshot_key(name, sha256), SCAN_VERSION)).fetchone()
+        if row is None:
+            return None
+        self.reused += 1
+        return json.loads(row[0])
+
+    def record(self, file_name, st, sha256, found):
+        """
+        Store the scan result of a file, as it was when `st` was taken (None
+        for a CaptureStore snapshot, recorded under its snapshot_key()).
+        """
+        self._write(file_name, st, sha256, json.dumps(found))
+        self.scanned += 1
+
+    def scan(self, file_name):
+        """
+        scan_capture() result for a file in the folder, from the index when the
+        file hasn't changed since it was recorded.
+        """
+        found, st = self.lookup(file_name)
+        if found is None:
+            found, sha256 = _scan_file(os.path.join(self.folder, file_name))
+            self.record(file_name, st, sha256, found)
+        return found
+
+    def _write(self, file_name, st, sha256, urls):
+        self._db.execute("INSERT OR REPLACE INTO captures VALUES (?, ?, ?, ?, ?, ?)",
+                         (file_name, st.st_size if st else None, st.st_mtime_ns if st else None,
+                          sha256, SCAN_VERSION, urls))
+        self._pending += 1
+        if self._pending >= INDEX_COMMIT_EVERY:
+            self.commit()
+
+    def prune(self, keep):
+        """
+        Forget files no longer in the folder (names not in `keep`).
+        """
+        keep = set(keep)
+        gone = [name for (name,) in self._db.execute("SELECT name FROM captures")
+                if name not in keep]
+        self._db.executemany("DELETE FROM captures WHERE name = ?", [(name,) for name in gone])
+        self.commit()
+
+    def commit(self):
+        self._db.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+
+def _scan_pending(folder, pending, workers):
+    # (file name, stat, result, sha256) for each pending file, as scans finish
+    if workers <= 1 or len(pending) <= 1:
+        for file_name, st in pending:
+            try:
+                yield (file_name, st) + _scan_file(os.path.join(folder, file_name))
+            except OSError as e:
+                print(f"[!] Can't read capture {file_name}: {e}")
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+        futures = {pool.submit(_scan_file, os.path.join(folder, file_name)): (file_name, st)
+                   for file_name, st in pending}
+        for future in as_completed(futures):
+            file_name, st = futures[future]
+            try:
+                yield (file_name, st) + future.result()
+            except OSError as e:
+                print(f"[!] Can't read capture {file_name}: {e}")
+
+
+def _scan_snapshots(store, extension, index):
+    # Distinct snapshots in a CaptureStore, read in timeline order so each
+    # delta applies to the object read just before
+    for name, sha256 in store.snapshots(extension):
+        found = index.lookup_snapshot(name, sha256) if index is not None else None
+        if found is None:
+            found = scan_data(store.read_object(sha256))
+            if index is not None:
+                index.record(snapshot_key(name, sha256), None, sha256, found)
+        yield name, sha256, found
+
+
+def scan_folder(folder, extension=".html", index=None, workers=1):
+    """
+    Yield (file name, scan_capture() result) for every capture in `folder`,
+    and for every distinct snapshot of a CaptureStore kept there (these by
+    their snapshot name, repeats left out).
+    With a CaptureIndex, unchanged files come from it (first) and only new or
+    changed ones are read. Those are spread over `workers` processes and
+    yielded as each one finishes, so the order isn't the folder's.
+    """
+    names = [name for name in os.listdir(folder) if name.endswith(extension)]
+    snapshots = []
+    if os.path.exists(os.path.join(folder, MANIFEST)):
+        store = CaptureStore(folder)
+        for name, sha256, found in _scan_snapshots(store, extension, index):
+            snapshots.append(snapshot_key(name, sha256))
+            yield name, found
+    pending = []
+    for file_name in names:
+        try:
+            found, st = index.lookup(file_name) if index is not None else (None, None)
+        except OSError as e:
+            print(f"[!] Can't read capture {file_name}: {e}")
+            continue
+        if found is not None:
+            yield file_name, found
+        else:
+            pending.append((file_name, st))
+
+    for file_name, st, found, sha256 in _scan_pending(folder, pending, workers):
+        if index is not None:
+            index.record(file_name, st, sha256, found)
+        yield file_name, found
+    if index is not None:
+        index.prune(names + snapshots)
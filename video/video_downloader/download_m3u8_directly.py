@@ -1,79 +1,50 @@
 import os
-import requests
-import m3u8
-import subprocess
-from urllib.parse import urljoin
+import sys
 
-OUTPUT_FOLDER = "test_output"
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-
-def download_hls_stream(m3u8_url, output_name):
-    
-    headers = {
-        "User-Agent": "Mozilla/5.0"
-    }
-
-    print(f"[+] Fetching: {m3u8_url}")
-    try:
-        r = requests.get(m3u8_url, headers=headers, timeout=10)
-        r.raise_for_status()
-    except Exception as e:
-        print(f"[-] Error fetching playlist: {e}")
-        return
-
-    try:
-        playlist = m3u8.loads(r.text)
-
-        # 🔁 Handle master playlist (EXT-X-STREAM-INF)
-        if playlist.is_variant:
-            print(f"[i] Master playlist with {len(playlist.playlists)} variants found.")
-            best_variant = playlist.playlists[0]  # Or use resolution/bitrate logic
-            variant_uri = urljoin(m3u8_url, best_variant.uri)
-            print(f"[→] Switching to variant playlist: {variant_uri}")
-            
-            # Fetch and re-parse the selected variant
-            r = requests.get(variant_uri, headers=headers, timeout=10)
-            r.raise_for_status()
-            playlist = m3u8.loads(r.text)
+# Shared helpers (forgehub/) live at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
 
-    except Exception as e:
-        print(f"[-] Error parsing playlist: {e}")
-        return
+from hls_fetch import DEFAULT_CONCURRENCY
+from hls_download import download_hls_stream as download_stream
+from forgehub.telemetry import TELEMETRY
 
-    if not playlist.segments:
-        print("[-] No segments found in playlist.")
-        print(r.text[:300])
-        return
-
-    filelist_path = os.path.join(OUTPUT_FOLDER, f"{output_name}_filelist.txt")
-    segment_files = []
-
-    with open(filelist_path, 'w') as f:
-        for i, segment in enumerate(playlist.segments):
-            segment_url = urljoin(m3u8_url, segment.uri)
-            segment_path = os.path.join(OUTPUT_FOLDER, f"{output_name}_{i}.ts")
-            try:
-                seg_resp = requests.get(segment_url, headers=headers, timeout=10)
-                with open(segment_path, 'wb') as seg_file:
-                    seg_file.write(seg_resp.content)
-                f.write(f"file '{segment_path}'\n")
-                segment_files.append(segment_path)
-                print(f"[✓] Segment {i+1}/{len(playlist.segments)}")
-            except Exception as e:
-                print(f"[-] Failed to download segment {i}: {e}")
-
-    output_video = os.path.join(OUTPUT_FOLDER, f"{output_name}.mp4")
-    cmd = f'ffmpeg -f concat -safe 0 -i "{filelist_path}" -c copy "{output_video}"'
-    subprocess.run(cmd, shell=True)
-    print(f"[✓] Merged video saved as: {output_video}")
-
-    for file in segment_files:
-        os.remove(file)
-    os.remove(filelist_path)
+OUTPUT_FOLDER = "test_output"
+# Segments fetched in parallel
+CONCURRENCY = DEFAULT_CONCURRENCY
+# "segments" (per-segment files + concat), "stream" (single .ts) or "pipe" (ffmpeg → .mp4)
+OUTPUT_MODE = "segments"
+# Rendition choice for master playlists: "highest", "resolution", "bitrate" or "throughput"
+VARIANT_POLICY = "highest"
+MAX_HEIGHT = None       # e.g. 720, used by "resolution" (and as a cap by "throughput")
+MAX_BANDWIDTH = None    # bits/s, used by "bitrate" (and as a cap by "throughput")
+# Live playlists are recorded until EXT-X-ENDLIST, ^C, or this many seconds
+LIVE_MAX_DURATION = None
+# Clip in seconds from the start of the stream (None = from the start / to the end);
+# only the segments covering it are downloaded, the edges are cut when merging
+CLIP_START = None
+CLIP_END = None
+# ffmpeg's -loglevel when merging
+FFMPEG_LOGLEVEL = "info"
+os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-# ▶️ TEST URL
-test_url = "https://bitdash-a.akamaihd.net/content/sintel/hls/playlist.m3u8"
-download_hls_stream(test_url, "sintel_test")
+def download_hls_stream(m3u8_url, output_name, **options):
+    """
+    hls_download.download_hls_stream() with this script's settings, which
+    keyword `options` override.
+    """
+    settings = {"concurrency": CONCURRENCY, "output_mode": OUTPUT_MODE,
+                "variant_policy": VARIANT_POLICY, "max_height": MAX_HEIGHT,
+                "max_bandwidth": MAX_BANDWIDTH, "max_duration": LIVE_MAX_DURATION,
+                "clip_start": CLIP_START, "clip_end": CLIP_END,
+                "ffmpeg_loglevel": FFMPEG_LOGLEVEL}
+    settings.update(options)
+    return download_stream(m3u8_url, OUTPUT_FOLDER, output_name, **settings)
+
+if __name__ == "__main__":
+    # ▶️ TEST URL
+    test_url = "https://bitdash-a.akamaihd.net/content/sintel/hls/playlist.m3u8"
+    download_hls_stream(test_url, "sintel_test")
+    TELEMETRY.export(os.path.join(OUTPUT_FOLDER, "telemetry"))
 
 
 # Output:
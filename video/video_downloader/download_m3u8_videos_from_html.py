@@ -1,107 +1,114 @@
 import os
-import re
-import requests
-import m3u8
-import subprocess
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+import sys
+
+# Shared helpers (forgehub/) live at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from hls_fetch import DEFAULT_CONCURRENCY, BandwidthBudget, create_session
+from hls_download import download_hls_stream as download_stream
+from capture_scan import DEFAULT_SCAN_WORKERS, CaptureIndex, scan_capture, scan_folder
+from stream_probe import PROBE_CONCURRENCY, ProbeCache, probe_urls
+from stream_scheduler import StreamScheduler
+from forgehub.telemetry import TELEMETRY
+from forgehub.urls import dedupe_urls
 
 # Folder with HTML captures
 INPUT_FOLDER = "./browser_captures"
+# Processes scanning new / changed captures
+SCAN_WORKERS = DEFAULT_SCAN_WORKERS
 OUTPUT_FOLDER = "./downloaded_videos"
+# Segments fetched in parallel per stream
+CONCURRENCY = DEFAULT_CONCURRENCY
+# "segments" (per-segment files + concat), "stream" (single .ts) or "pipe" (ffmpeg → .mp4)
+OUTPUT_MODE = "segments"
+# Rendition choice for master playlists: "highest", "resolution", "bitrate" or "throughput"
+VARIANT_POLICY = "highest"
+MAX_HEIGHT = None       # e.g. 720, used by "resolution" (and as a cap by "throughput")
+MAX_BANDWIDTH = None    # bits/s, used by "bitrate" (and as a cap by "throughput")
+# Live playlists are recorded until EXT-X-ENDLIST, ^C, or this many seconds
+LIVE_MAX_DURATION = None
+# Clip in seconds from the start of the stream (None = from the start / to the end);
+# only the segments covering it are downloaded, the edges are cut when merging
+CLIP_START = None
+CLIP_END = None
+# Batch limits: streams at once overall / per host, attempts per stream
+MAX_PARALLEL_STREAMS = 3
+MAX_STREAMS_PER_HOST = 1
+MAX_ATTEMPTS = 3
+# Total download rate shared by all streams, in bytes/s (None = unlimited)
+BANDWIDTH_BUDGET = None
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-# Regex to catch m3u8 URLs even in JS
-M3U8_REGEX = re.compile(r'https?://[^\s"\'<>]+\.m3u8')
+# Known-dead URLs (403, timeouts, ...) are skipped until their entry expires
+PROBE_CACHE = os.path.join(OUTPUT_FOLDER, "probe_cache.json")
 
 def extract_m3u8_from_html(file_path):
-    urls = set()
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        soup = BeautifulSoup(f.read(), 'html.parser')
-        
-        # Search in raw text
-        text = soup.get_text()
-        urls.update(M3U8_REGEX.findall(text))
-        
-        # Also check in <script> tags
-        for script in soup.find_all('script'):
-            if script.string:
-                urls.update(M3U8_REGEX.findall(script.string))
-    return urls
-
-def download_hls_stream(m3u8_url, output_name):
-    print(f"\n[+] Downloading from: {m3u8_url}")
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 " +
-                      "(KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
-    }
-
-    try:
-        r = requests.get(m3u8_url, headers=headers, timeout=10)
-        r.raise_for_status()
-    except Exception as e:
-        print(f"[-] Failed to fetch playlist: {e}")
-        return
-
-    try:
-        playlist = m3u8.loads(r.text)
-    except Exception as e:
-        print(f"[-] Error parsing playlist: {e}")
-        print("[!] Partial content for debug:")
-        print(r.text[:500])
-        return
-
-    if not playlist.segments:
-        print("[-] No segments found in the playlist. Possibly a master playlist or empty stream.")
-        print("[!] Here’s a snippet of the playlist:")
-        print(r.text[:500])
-        return
-
-    filelist_path = os.path.join(OUTPUT_FOLDER, f"{output_name}_filelist.txt")
-    segment_files = []
-
-    with open(filelist_path, 'w') as f:
-        for i, seg in enumerate(playlist.segments):
-            seg_url = urljoin(m3u8_url, seg.uri)
-            seg_name = os.path.join(OUTPUT_FOLDER, f"{output_name}_{i}.ts")
-
-            try:
-                seg_resp = requests.get(seg_url, headers=headers, timeout=10)
-                seg_resp.raise_for_status()
-                with open(seg_name, 'wb') as seg_file:
-                    seg_file.write(seg_resp.content)
-                f.write(f"file '{seg_name}'\n")
-                segment_files.append(seg_name)
-                print(f"[✓] Segment {i+1}/{len(playlist.segments)} downloaded.")
-            except Exception as e:
-                print(f"[-] Failed segment {i}: {e}")
-
-    final_output = os.path.join(OUTPUT_FOLDER, f"{output_name}.mp4")
-    cmd = f'ffmpeg -loglevel error -f concat -safe 0 -i "{filelist_path}" -c copy "{final_output}"'
-    subprocess.run(cmd, shell=True)
-    print(f"[✓] Merged video saved as: {final_output}")
-
-    # Cleanup
-    for f in segment_files:
-        os.remove(f)
-    os.remove(filelist_path)
+    # One scan of the raw bytes catches m3u8 URLs in text, JS and attributes alike
+    return set(scan_capture(file_path)["m3u8"])
+
+def download_hls_stream(m3u8_url, output_name, **options):
+    """
+    hls_download.download_hls_stream() with this script's settings, which
+    keyword `options` override (e.g. `budget`, a BandwidthBudget shared with
+    other streams). Returns the output path, or None if it failed.
+    """
+    settings = {"concurrency": CONCURRENCY, "output_mode": OUTPUT_MODE,
+                "variant_policy": VARIANT_POLICY, "max_height": MAX_HEIGHT,
+                "max_bandwidth": MAX_BANDWIDTH, "max_duration": LIVE_MAX_DURATION,
+                "clip_start": CLIP_START, "clip_end": CLIP_END}
+    settings.update(options)
+    return download_stream(m3u8_url, OUTPUT_FOLDER, output_name, **settings)
 
 def main():
-    all_m3u8_urls = set()
-    for filename in os.listdir(INPUT_FOLDER):
-        if filename.endswith('.html'):
-            file_path = os.path.join(INPUT_FOLDER, filename)
-            found_urls = extract_m3u8_from_html(file_path)
-            all_m3u8_urls.update(found_urls)
+    # URL -> number of captures it appears in; the most-seen streams go first
+    seen = {}
+    # Captures already scanned on an earlier run (same size/mtime or content)
+    # come from the folder's index; only new or changed files are read
+    with CaptureIndex(INPUT_FOLDER) as index:
+        for filename, found in scan_folder(INPUT_FOLDER, index=index, workers=SCAN_WORKERS):
+            found_urls = set(found["m3u8"])
+            for url in found_urls:
+                seen[url] = seen.get(url, 0) + 1
             print(f"[i] {filename}: found {len(found_urls)} m3u8 URLs")
+        print(f"[i] Captures: {index.scanned} scanned, {index.reused} unchanged since the last run")
 
-    if not all_m3u8_urls:
+    if not seen:
         print("[-] No m3u8 URLs found.")
         return
 
-    for idx, url in enumerate(all_m3u8_urls):
-        download_hls_stream(url, f"video_{idx}")
+    # One job per stream: http/https copies, host case, default ports, fragments
+    # and query order don't make a URL different
+    groups, removed = dedupe_urls(seen)
+    seen = {url: sum(seen[v] for v in variants) for url, variants in groups.items()}
+    if removed:
+        print(f"[i] Removed {removed} duplicate URLs, {len(seen)} streams left.")
+
+    # Check every candidate at once so dead hosts cost one short probe, not a download
+    print(f"[i] Probing {len(seen)} stream URLs...")
+    probes = probe_urls(create_session(concurrency=PROBE_CONCURRENCY, job="probe"), seen,
+                        ProbeCache(PROBE_CACHE))
+    for url, (status, detail) in probes.items():
+        if status != "alive":
+            print(f"[-] Skipping ({status}, {detail}): {url}")
+            del seen[url]
+    if not seen:
+        print("[-] No reachable m3u8 URLs.")
+        return
+
+    budget = BandwidthBudget(BANDWIDTH_BUDGET) if BANDWIDTH_BUDGET else None
+    scheduler = StreamScheduler(lambda job: download_hls_stream(job.url, job.output_name,
+                                                                budget=budget),
+                                MAX_PARALLEL_STREAMS, MAX_STREAMS_PER_HOST, MAX_ATTEMPTS)
+    for idx, url in enumerate(sorted(seen, key=seen.get, reverse=True)):
+        scheduler.add(url, f"video_{idx}", priority=-seen[url])
+
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        print("\n[i] Interrupted, rerun to resume unfinished streams.")
+    scheduler.report()
+    # Per-host / per-stream request timings, to size concurrency and spot slow CDNs
+    TELEMETRY.export(os.path.join(OUTPUT_FOLDER, "telemetry"))
 
 if __name__ == "__main__":
     main()
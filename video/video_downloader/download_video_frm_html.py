@@ -1,32 +1,37 @@
 import os
-import re
+import sys
 import requests
-from bs4 import BeautifulSoup
+
+# Shared helpers (forgehub/) live at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from forgehub.store import shared_store
+from forgehub.telemetry import TELEMETRY, job_scope
+from capture_scan import DEFAULT_SCAN_WORKERS, CaptureIndex, scan_capture, scan_folder
 
 # Define directories
 CAPTURES_FOLDER = "browser_captures"
 DOWNLOADS_FOLDER = "downloads"
+# Processes scanning new / changed captures
+SCAN_WORKERS = DEFAULT_SCAN_WORKERS
 
 # Create the downloads folder if it doesn't exist
 if not os.path.exists(DOWNLOADS_FOLDER):
     os.makedirs(DOWNLOADS_FOLDER)
 
-def extract_video_url_from_html(file_path):
+def extract_video_url_from_html(file_path, found=None):
     """
-    Extracts the video source URL from the given HTML file.
+    Extracts the video source URL from the given HTML file (or from its
+    already extracted URLs, `found`).
     """
     try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            html_content = file.read()
-
-        # Parse the HTML
-        soup = BeautifulSoup(html_content, "html.parser")
-
-        # Search for video.src pattern in JavaScript inside <script> tags
-        video_src_match = re.search(r'video\.src\s*=\s*[\'"]([^\'"]+\.mp4[^\']*)[\'"]', html_content)
-
-        if video_src_match:
-            video_url = video_src_match.group(1)
+        if found is None:
+            found = scan_capture(file_path)
+
+        # video.src assignments in JavaScript first, then <video>/<source> mp4 sources
+        candidates = found["video_src"] + [url for url in found["video_tag"] + found["source_tag"]
+                                           if url in found["mp4"]]
+        if candidates:
+            video_url = candidates[0]
             print(f"[SUCCESS] Extracted video URL from {file_path}: {video_url}")
             return video_url
 
@@ -50,18 +55,16 @@ def download_video(video_url):
         file_path = os.path.join(DOWNLOADS_FOLDER, file_name)
 
         print(f"[INFO] Downloading video from {video_url}...")
-        response = requests.get(video_url, stream=True)
-
-        if response.status_code == 200:
-            with open(file_path, "wb") as file:
-                for chunk in response.iter_content(chunk_size=1024):
-                    file.write(chunk)
-            print(f"[SUCCESS] Video saved at: {file_path}")
-            return file_path
-        else:
-            print(f"[ERROR] Failed to download video. Status: {response.status_code}")
-            return None
-
+        # Through the media store: a video fetched before (on any run, from any
+        # page) is linked from it; new ones use parallel byte ranges when allowed
+        with job_scope(file_name):
+            how = shared_store().fetch(video_url, file_path, ranged=True)
+        print(f"[SUCCESS] Video saved at: {file_path} ({how})")
+        return file_path
+
+    except requests.exceptions.HTTPError as e:
+        print(f"[ERROR] Failed to download video. Status: {e.response.status_code}")
+        return None
     except Exception as e:
         print(f"[ERROR] Download error: {e}")
         return None
@@ -71,14 +74,19 @@ def process_all_html_files():
     Reads all .html files in the `browser_captures/` folder, extracts video URLs, and downloads them.
     """
     print("[INFO] Scanning HTML files for video URLs...")
-    
-    for file_name in os.listdir(CAPTURES_FOLDER):
-        if file_name.endswith(".html"):
+
+    # Unchanged captures come from the folder's index instead of being read again
+    with CaptureIndex(CAPTURES_FOLDER) as index:
+        for file_name, found in scan_folder(CAPTURES_FOLDER, index=index, workers=SCAN_WORKERS):
             file_path = os.path.join(CAPTURES_FOLDER, file_name)
-            video_url = extract_video_url_from_html(file_path)
+            video_url = extract_video_url_from_html(file_path, found)
 
             if video_url:
                 download_video(video_url)
+        print(f"[INFO] Captures: {index.scanned} scanned, {index.reused} unchanged since the last run")
+
+    # Request timings per host and per video
+    TELEMETRY.export(os.path.join(DOWNLOADS_FOLDER, "telemetry"))
 
 if __name__ == "__main__":
     process_all_html_files()
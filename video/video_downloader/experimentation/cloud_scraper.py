@@ -1,4 +1,5 @@
 import os
+import sys
 import time
 import json
 import undetected_chromedriver as uc
@@ -7,6 +8,11 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from datetime import datetime
 
+# Shared helpers (forgehub/) live at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+from forgehub.captures import CaptureStore
+from forgehub.media_watch import enable_network_log, wait_for_media
+
 # Target URL
 VIDEO_PAGE_URL = "https://ottverse.com/free-hls-m3u8-test-urls/"
 
@@ -24,6 +30,8 @@ def setup_driver():
     options.add_argument("--disable-dev-shm-usage")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-popup-blocking")
+    # Log CDP network events, so the media request is seen the moment it's made
+    enable_network_log(options)
 
     driver = uc.Chrome(options=options)
 
@@ -82,27 +90,25 @@ def capture_network_requests(driver):
         print(f"[ERROR] Failed to extract network requests: {e}")
         return []
 
-def save_screenshot(driver):
+def save_screenshot(driver, captures):
     """
     Takes a screenshot of the browser every second.
     """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    screenshot_path = os.path.join(SAVE_FOLDER, f"screenshot_{timestamp}.png")
-    driver.save_screenshot(screenshot_path)
-    print(f"[INFO] Screenshot saved: {screenshot_path}")
+    screenshot_name = f"screenshot_{timestamp}.png"
+    how = captures.save(screenshot_name, driver.get_screenshot_as_png())
+    print(f"[INFO] Screenshot saved: {screenshot_name} ({how})")
 
-def save_page_source(driver):
+def save_page_source(driver, captures):
     """
     Saves the page source (HTML) every second.
     """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    html_path = os.path.join(SAVE_FOLDER, f"page_{timestamp}.html")
-
-    with open(html_path, "w", encoding="utf-8") as file:
-        file.write(driver.page_source)
-    print(f"[INFO] Page source saved: {html_path}")
+    html_name = f"page_{timestamp}.html"
+    how = captures.save(html_name, driver.page_source)
+    print(f"[INFO] Page source saved: {html_name} ({how})")
 
-def save_network_logs(driver):
+def save_network_logs(driver, captures):
     """
     Extracts and saves network activity logs (JavaScript-injected data, .m3u8, etc.).
     """
@@ -110,39 +116,33 @@ def save_network_logs(driver):
 
     if network_requests:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        json_path = os.path.join(SAVE_FOLDER, f"network_{timestamp}.json")
-
-        with open(json_path, "w", encoding="utf-8") as file:
-            json.dump(network_requests, file, indent=4)
-
-        print(f"[INFO] Network logs saved: {json_path}")
+        json_name = f"network_{timestamp}.json"
+        how = captures.save(json_name, json.dumps(network_requests, indent=4))
+        print(f"[INFO] Network logs saved: {json_name} ({how})")
     else:
         print("[WARNING] No network requests captured.")
 
-def wait_for_video_to_start(driver):
+def wait_for_video_to_start(driver, on_tick=None):
     """
-    Monitors the page until the video starts playing and extracts the .m3u8 URL.
+    Monitors the page until the video starts playing (its manifest or media
+    file is requested) and returns that URL. `on_tick` runs about every second
+    meanwhile.
     """
     print("[INFO] Waiting for the video to start playing...")
-    start_time = time.time()
-    while time.time() - start_time < 60:  # Wait up to 60 seconds
-        try:
-            video_element = driver.find_element(By.TAG_NAME, "video")
-            video_url = video_element.get_attribute("src")
-            if video_url and ".m3u8" in video_url:
-                print(f"[SUCCESS] Found .m3u8 URL: {video_url}")
-                return video_url
-        except:
-            pass
-        time.sleep(1)
-    
+    video_url = wait_for_media(driver, timeout=60, on_tick=on_tick)  # Wait up to 60 seconds
+    if video_url:
+        print(f"[SUCCESS] Found media URL: {video_url}")
+        return video_url
+
     print("[ERROR] Video did not start playing.")
     return None
 
 def monitor_page(driver):
     """
     Continuously captures screenshots, HTML, and network requests every second.
+    Snapshots go to a CaptureStore, which keeps each repeated one only once.
     """
+    captures = CaptureStore(SAVE_FOLDER)
     try:
         print("[INFO] Opening target page...")
         driver.get(VIDEO_PAGE_URL)
@@ -154,24 +154,25 @@ def monitor_page(driver):
         wait_for_overlay(driver)
 
         # Step 3: Monitor browser every second
-        start_time = time.time()
-        while time.time() - start_time < 60:  # Run for 60 seconds
-            save_screenshot(driver)
-            save_page_source(driver)
-            save_network_logs(driver)
+        def capture():
+            save_screenshot(driver, captures)
+            save_page_source(driver, captures)
+            save_network_logs(driver, captures)
 
-            # Step 4: Extract .m3u8 URL when video starts playing
-            m3u8_url = wait_for_video_to_start(driver)
-            if m3u8_url:
-                print(f"[SUCCESS] Extracted m3u8 URL: {m3u8_url}")
-                break
+        capture()
 
-            time.sleep(1)  # Capture data every second
+        # Step 4: Stop as soon as the video's .m3u8 (or media) URL is requested
+        m3u8_url = wait_for_video_to_start(driver, on_tick=capture)
+        if m3u8_url:
+            capture()  # the page as playback starts
+            print(f"[SUCCESS] Extracted m3u8 URL: {m3u8_url}")
 
     except Exception as e:
         print(f"[ERROR] Exception occurred: {e}")
 
     finally:
+        print(f"[INFO] Captures: {captures.summary()}")
+        captures.close()
         driver.quit()
 
 def main():
@@ -12,6 +12,12 @@ import time
 from urllib.parse import urlparse, parse_qs
 import requests
 import os
+import sys
+
+# Shared helpers (forgehub/) live at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+from forgehub.media_watch import enable_network_log, wait_for_media
+from forgehub.store import shared_store
 
 # Target Video Page
 VIDEO_PAGE_URL = "https://ottverse.com/free-hls-m3u8-test-urls/"
@@ -25,6 +31,8 @@ def setup_driver():
     options.add_argument("--disable-gpu")
     options.add_argument("--disable-dev-shm-usage")
     options.add_argument("--no-sandbox")
+    # Log CDP network events, so the .m3u8 request is seen the moment it's made
+    enable_network_log(options)
 
     driver = uc.Chrome(options=options)
     return driver
@@ -65,15 +73,11 @@ def extract_m3u8_url(driver):
     try:
         print("[INFO] Searching for .m3u8 URL...")
 
-        for _ in range(30):  # Retry for 30 seconds
-            m3u8_url = driver.execute_script("""
-                let urls = performance.getEntries().map(e => e.name);
-                return urls.find(url => url.includes('.m3u8') || url.includes('master.m3u8'));
-            """)
-            if m3u8_url:
-                print(f"[SUCCESS] Found .m3u8 URL: {m3u8_url}")
-                return m3u8_url
-            time.sleep(1)
+        # Returns as soon as the page requests it, waiting up to 30 seconds
+        m3u8_url = wait_for_media(driver, patterns=(".m3u8",), timeout=30)
+        if m3u8_url:
+            print(f"[SUCCESS] Found .m3u8 URL: {m3u8_url}")
+            return m3u8_url
 
         print("[WARNING] No .m3u8 URL found.")
         return None
@@ -115,18 +119,15 @@ def download_mp4(mp4_url, output_folder="downloads"):
         file_path = os.path.join(output_folder, file_name)
 
         print(f"[INFO] Downloading video from {mp4_url}...")
-        response = requests.get(mp4_url, stream=True)
-
-        if response.status_code == 200:
-            with open(file_path, "wb") as file:
-                for chunk in response.iter_content(chunk_size=1024):
-                    file.write(chunk)
-            print(f"[SUCCESS] Video saved at: {file_path}")
-            return file_path
-        else:
-            print(f"[ERROR] Failed to download video. Status: {response.status_code}")
-            return None
-
+        # Through the media store: a video fetched before (on any run, from any
+        # page) is linked from it; new ones use parallel byte ranges when allowed
+        how = shared_store().fetch(mp4_url, file_path, ranged=True)
+        print(f"[SUCCESS] Video saved at: {file_path} ({how})")
+        return file_path
+
+    except requests.exceptions.HTTPError as e:
+        print(f"[ERROR] Failed to download video. Status: {e.response.status_code}")
+        return None
     except Exception as e:
         print(f"[ERROR] Download error: {e}")
         return None
@@ -5,8 +5,13 @@ from selenium.webdriver.support import expected_conditions as EC
 import time
 import requests
 import os
+import sys
 import random
 
+# Shared helpers (forgehub/) live at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+from forgehub.store import shared_store
+
 def download_mp4(url, output_folder="downloads"):
     """
     Download an .mp4 file from the given URL and save it to the specified folder.
@@ -20,20 +25,14 @@ def download_mp4(url, output_folder="downloads"):
         file_name = os.path.basename(url)
         file_path = os.path.join(output_folder, file_name)
 
-        # Send a GET request to the URL
+        # Download to the specified path through the media store (linked if already
+        # stored, parallel ranges when supported)
         print(f"Downloading {url}...")
-        response = requests.get(url, stream=True)
-
-        # Check if the request was successful
-        if response.status_code == 200:
-            # Save the file to the specified path
-            with open(file_path, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=1024):
-                    file.write(chunk)
-            print(f"File saved to: {file_path}")
-        else:
-            print(f"Failed to download. Status code: {response.status_code}")
+        how = shared_store().fetch(url, file_path, ranged=True)
+        print(f"File saved to: {file_path} ({how})")
 
+    except requests.exceptions.HTTPError as e:
+        print(f"Failed to download. Status code: {e.response.status_code}")
     except Exception as e:
         print(f"An error occurred: {e}")
 
@@ -0,0 +1,362 @@
+import os
+import shutil
+import hashlib
+import subprocess
+from urllib.parse import urljoin
+
+from hls_journal import SegmentJournal
+
+# How fetched segments become the final video:
+#   "segments" - one .ts file per segment, merged by `ffmpeg -f concat` (resumable)
+#   "stream"   - appended in order to a single growing .ts file (resumable, no remux)
+#   "pipe"     - piped into one long-lived ffmpeg remux writing .mp4 (not resumable)
+#   "fmp4"     - like "stream" but for fMP4/CMAF: init section + fragments appended
+#                to a single .mp4, chosen automatically for such playlists
+#   "sample-aes" - like "segments" but merged through ffmpeg's HLS demuxer, which
+#                decrypts SAMPLE-AES; chosen automatically for such playlists
+OUTPUT_MODES = ("segments", "stream", "pipe", "fmp4", "sample-aes")
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def copy_and_hash(src, dst):
+    """
+    Copy file object `src` into `dst`, returning (size, sha256 hex).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b""):
+        dst.write(chunk)
+        digest.update(chunk)
+        size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def trim_options(trim):
+    """
+    ffmpeg output options cutting a clip out of the assembled segments:
+    `trim` is (offset, duration) in seconds, duration None meaning to the end.
+    With stream copy the clip starts on the first keyframe after the offset.
+    """
+    if not trim:
+        return []
+    offset, duration = trim
+    options = ["-ss", f"{offset:.3f}"]
+    if duration is not None:
+        options += ["-t", f"{duration:.3f}"]
+    return options
+
+
+def remove_output(path):
+    """
+    Delete an earlier output at `path` before a new one is written there. It
+    may be a hardlink into the media store (forgehub.store), and writing
+    through it would change the stored object; a new file leaves that intact.
+    """
+    if os.path.lexists(path):
+        os.remove(path)
+
+
+class SegmentFilesAssembler:
+    """
+    Legacy layout: every segment in its own file, concatenated at the end.
+    Segments may be written in any order, so a failed segment doesn't stop
+    the rest of the job.
+    """
+    in_order = False
+
+    def __init__(self, output_folder, output_name, ffmpeg_loglevel="error", trim=None):
+        self.output_folder = output_folder
+        self.output_name = output_name
+        self.ffmpeg_loglevel = ffmpeg_loglevel
+        self.trim = trim
+        self.output_path = os.path.join(output_folder, f"{output_name}.mp4")
+        self.journal = SegmentJournal(os.path.join(output_folder, f"{output_name}_journal.jsonl"))
+        self.segment_files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def segment_path(self, index):
+        return os.path.join(self.output_folder, f"{self.output_name}_{index}.ts")
+
+    def resume(self, urls):
+        """
+        Return the indices a previous run already stored and verified.
+        """
+        self.segment_files = [self.segment_path(i) for i in range(len(urls))]
+        return {i for i, url in enumerate(urls)
+                if self.journal.is_verified(i, url, self.segment_files[i])}
+
+    def write(self, result):
+        with open(self.segment_files[result.index], "wb") as seg_file:
+            size, sha256 = copy_and_hash(result.body, seg_file)
+        self.journal.record(result.index, result.url, size, sha256)
+
+    def finish(self):
+        """
+        Merge the segments; returns the output path, or None if ffmpeg failed
+        (segments and journal are then kept for the next run).
+        """
+        self.journal.close()
+        filelist_path = os.path.join(self.output_folder, f"{self.output_name}_filelist.txt")
+        with open(filelist_path, "w") as f:
+            for seg_name in self.segment_files:
+                f.write(f"file '{os.path.abspath(seg_name)}'\n")
+
+        remove_output(self.output_path)
+        cmd = (f'ffmpeg -loglevel {self.ffmpeg_loglevel} -f concat -safe 0 '
+               f'-i "{filelist_path}" {" ".join(trim_options(self.trim))} '
+               f'-c copy "{self.output_path}"')
+        if subprocess.run(cmd, shell=True).returncode != 0:
+            print("[-] ffmpeg merge failed. Segments kept for the next run.")
+            return None
+
+        for seg_name in self.segment_files:
+            os.remove(seg_name)
+        os.remove(filelist_path)
+        self.journal.remove()
+        return self.output_path
+
+    def close(self):
+        self.journal.close()
+
+
+class SampleAesAssembler(SegmentFilesAssembler):
+    """
+    SAMPLE-AES only encrypts parts of each elementary stream, so segments are
+    stored untouched and the merge goes through a local media playlist whose
+    EXT-X-KEY tags point at the cached keys; ffmpeg's HLS demuxer decrypts
+    while remuxing to .mp4.
+    """
+
+    def __init__(self, output_folder, output_name, ffmpeg_loglevel="error", trim=None,
+                 plan=None, base_url=None, key_cache=None):
+        super().__init__(output_folder, output_name, ffmpeg_loglevel, trim)
+        self.plan = plan
+        self.base_url = base_url
+        self.key_cache = key_cache
+
+    def finish(self):
+        self.journal.close()
+        prefix = os.path.join(self.output_folder, self.output_name)
+        playlist_path = f"{prefix}_local.m3u8"
+        key_files = {}
+        target = max((int(item.segment.duration or 0) + 1 for item in self.plan), default=1)
+
+        lines = ["#EXTM3U", f"#EXT-X-TARGETDURATION:{target}",
+                 f"#EXT-X-MEDIA-SEQUENCE:{self.plan[0].sequence}"]
+        current_key = None
+        for i, item in enumerate(self.plan):
+            key = item.segment.key
+            key_id = (key.uri, key.iv) if key is not None else None
+            if key_id != current_key:
+                if key is None or (key.method or "NONE").upper() == "NONE":
+                    lines.append("#EXT-X-KEY:METHOD=NONE")
+                else:
+                    key_url = urljoin(self.base_url, key.uri)
+                    if key_url not in key_files:
+                        key_files[key_url] = f"{prefix}_key{len(key_files)}.bin"
+                        with open(key_files[key_url], "wb") as f:
+                            f.write(self.key_cache.get(key_url))
+                    tag = f'#EXT-X-KEY:METHOD=SAMPLE-AES,URI="{os.path.abspath(key_files[key_url])}"'
+                    lines.append(tag + (f",IV={key.iv}" if key.iv else ""))
+                current_key = key_id
+            lines.append(f"#EXTINF:{item.segment.duration or 0},")
+            lines.append(os.path.abspath(self.segment_files[i]))
+        lines.append("#EXT-X-ENDLIST")
+        with open(playlist_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+        remove_output(self.output_path)
+        cmd = ["ffmpeg", "-loglevel", self.ffmpeg_loglevel, "-y",
+               "-allowed_extensions", "ALL", "-protocol_whitelist", "file,crypto,data",
+               "-i", playlist_path, *trim_options(self.trim), "-c", "copy", self.output_path]
+        ok = subprocess.run(cmd).returncode == 0
+        for path in key_files.values():
+            os.remove(path)
+        if not ok:
+            print("[-] ffmpeg SAMPLE-AES merge failed. Segments kept for the next run.")
+            return None
+
+        for seg_name in self.segment_files:
+            os.remove(seg_name)
+        os.remove(playlist_path)
+        self.journal.remove()
+        return self.output_path
+
+
+class StreamAssembler:
+    """
+    Appends segments in playlist order to one growing .ts file. Every byte is
+    written once and no per-segment files or concat list are created. The
+    journal records each segment's offset so a rerun can truncate the file back
+    to the last verified segment and continue from there.
+
+    With `trim` (a clip), the finished file goes through one short ffmpeg
+    stream-copy pass that cuts the edges off.
+    """
+    in_order = True
+
+    def __init__(self, output_folder, output_name, extension="ts", ffmpeg_loglevel="error",
+                 trim=None):
+        self.output_path = os.path.join(output_folder, f"{output_name}.{extension}")
+        self.ffmpeg_loglevel = ffmpeg_loglevel
+        self.trim = trim
+        self.journal = SegmentJournal(os.path.join(output_folder, f"{output_name}_journal.jsonl"))
+        self._out = None
+        self._offset = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def resume(self, urls):
+        """
+        Keep the longest verified prefix of the output file and return its indices.
+        """
+        kept = []
+        offset = 0
+        if os.path.exists(self.output_path) and os.stat(self.output_path).st_nlink > 1:
+            # A finished output linked from the media store, not a partial one
+            remove_output(self.output_path)
+        if os.path.exists(self.output_path):
+            with open(self.output_path, "rb") as f:
+                for i, url in enumerate(urls):
+                    entry = self.journal.entries.get(i)
+                    if not entry or entry["uri"] != url or entry.get("offset") != offset:
+                        break
+                    f.seek(offset)
+                    digest = hashlib.sha256()
+                    remaining = entry["size"]
+                    while remaining:
+                        chunk = f.read(min(COPY_CHUNK_SIZE, remaining))
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        remaining -= len(chunk)
+                    if remaining or digest.hexdigest() != entry["sha256"]:
+                        break
+                    kept.append(entry)
+                    offset += entry["size"]
+
+        if len(kept) != len(self.journal.entries):
+            self.journal.rewrite(kept)
+        self._out = open(self.output_path, "r+b" if kept else "wb")
+        self._out.truncate(offset)
+        self._out.seek(offset)
+        self._offset = offset
+        return {entry["index"] for entry in kept}
+
+    def write(self, result):
+        size, sha256 = copy_and_hash(result.body, self._out)
+        # Data must hit the file before the journal claims it
+        self._out.flush()
+        self.journal.record(result.index, result.url, size, sha256, offset=self._offset)
+        self._offset += size
+
+    def finish(self):
+        self.close()
+        self.journal.remove()
+        if self.trim:
+            root, extension = os.path.splitext(self.output_path)
+            trimmed = f"{root}.trim{extension}"
+            cmd = ["ffmpeg", "-loglevel", self.ffmpeg_loglevel, "-y", "-i", self.output_path,
+                   *trim_options(self.trim), "-c", "copy", trimmed]
+            if subprocess.run(cmd).returncode == 0:
+                os.replace(trimmed, self.output_path)
+            else:
+                print("[!] ffmpeg trim failed, keeping the whole segments of the clip.")
+                if os.path.exists(trimmed):
+                    os.remove(trimmed)
+        return self.output_path
+
+    def close(self):
+        if self._out is not None and not self._out.closed:
+            self._out.close()
+        self.journal.close()
+
+
+class FfmpegPipeAssembler:
+    """
+    Streams segments in order into the stdin of a single ffmpeg process that
+    remuxes to .mp4 on the fly, so nothing but the final file touches disk.
+    """
+    in_order = True
+
+    def __init__(self, output_folder, output_name, ffmpeg_loglevel="error", trim=None,
+                 input_format="mpegts"):
+        self.output_path = os.path.join(output_folder, f"{output_name}.mp4")
+        self.ffmpeg_loglevel = ffmpeg_loglevel
+        self.trim = trim
+        self.input_format = input_format
+        self._proc = None
+        self._broken = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def resume(self, urls):
+        remove_output(self.output_path)
+        self._proc = subprocess.Popen(
+            ["ffmpeg", "-loglevel", self.ffmpeg_loglevel, "-y",
+             "-f", self.input_format, "-i", "pipe:0", *trim_options(self.trim),
+             "-c", "copy", self.output_path],
+            stdin=subprocess.PIPE,
+        )
+        return set()
+
+    def write(self, result):
+        if self._broken:
+            return
+        try:
+            shutil.copyfileobj(result.body, self._proc.stdin, COPY_CHUNK_SIZE)
+        except BrokenPipeError:
+            # ffmpeg exited early; finish() reports it
+            self._broken = True
+
+    def finish(self):
+        try:
+            self._proc.stdin.close()
+        except BrokenPipeError:
+            self._broken = True
+        if self._proc.wait() != 0 or self._broken:
+            print("[-] ffmpeg remux failed.")
+            return None
+        return self.output_path
+
+    def close(self):
+        # Only reached with a live process if the job was interrupted
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+
+
+def open_assembler(mode, output_folder, output_name, ffmpeg_loglevel="error", trim=None,
+                   **options):
+    """
+    Create the assembler for one of OUTPUT_MODES. "sample-aes" also needs
+    `plan`, `base_url` and `key_cache` in `options`. `trim` = (offset, duration)
+    cuts a clip out of the assembled segments (see trim_options()).
+    """
+    if mode == "segments":
+        return SegmentFilesAssembler(output_folder, output_name, ffmpeg_loglevel, trim)
+    if mode == "stream":
+        return StreamAssembler(output_folder, output_name, ffmpeg_loglevel=ffmpeg_loglevel,
+                               trim=trim)
+    if mode == "pipe":
+        return FfmpegPipeAssembler(output_folder, output_name, ffmpeg_loglevel, trim)
+    if mode == "fmp4":
+        return StreamAssembler(output_folder, output_name, extension="mp4",
+                               ffmpeg_loglevel=ffmpeg_loglevel, trim=trim)
+    if mode == "sample-aes":
+        return SampleAesAssembler(output_folder, output_name, ffmpeg_loglevel, trim, **options)
+    raise ValueError(f"Unknown output mode {mode!r}, expected one of {OUTPUT_MODES}")
@@ -0,0 +1,356 @@
+import os
+import re
+import time
+import random
+import shutil
+import struct
+import hashlib
+import tempfile
+import threading
+import subprocess
+import http.server
+
+try:
+    from cryptography.hazmat.primitives import padding
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:  # only needed for encrypted streams
+    Cipher = None
+
+# Synthetic HLS origin for benchmarks: a master playlist of renditions, each
+# a VOD media playlist of generated segments.
+#   /master.m3u8           master playlist
+#   /v<n>/index.m3u8       media playlist of rendition n (the last one is the largest)
+#   /v<n>/seg<i>.ts|.m4s   segments; /v<n>/init.mp4 (fMP4); /v<n>/key.bin (AES-128)
+#   /v<n>/all.ts|.m4s      every segment in one file, for EXT-X-BYTERANGE playlists
+SEGMENT_DURATION = 4.0
+TS_PACKET_SIZE = 188
+# TS segments carry a real (tiny) video encoded by ffmpeg, so the modes that
+# remux through ffmpeg can be benchmarked too; null packets pad them to size
+TS_VIDEO = ["-f", "lavfi", "-i", "testsrc=size=64x36:rate=25", "-c:v", "mpeg2video",
+            "-g", str(int(25 * SEGMENT_DURATION)), "-fflags", "+bitexact"]
+NULL_PACKET = b"\x47\x1f\xff\x10" + b"\xff" * (TS_PACKET_SIZE - 4)
+_ts_clips = {}
+_ts_clips_lock = threading.Lock()
+
+
+def _box(kind, payload):
+    return struct.pack(">I", 8 + len(payload)) + kind + payload
+
+
+def encoded_ts_segments(count):
+    """
+    `count` MPEG-TS segments of SEGMENT_DURATION seconds each, cut from one
+    encoded test video (cached per count), or None without a working ffmpeg.
+    """
+    with _ts_clips_lock:
+        if count in _ts_clips:
+            return _ts_clips[count]
+        segments = None
+        if shutil.which("ffmpeg"):
+            with tempfile.TemporaryDirectory(prefix="hls_bench_ts_") as tmp:
+                cmd = ["ffmpeg", "-loglevel", "error", *TS_VIDEO,
+                       "-t", str(count * SEGMENT_DURATION), "-f", "hls",
+                       "-hls_time", str(SEGMENT_DURATION), "-hls_list_size", "0",
+                       "-hls_segment_filename", os.path.join(tmp, "seg%d.ts"),
+                       os.path.join(tmp, "index.m3u8")]
+                if subprocess.run(cmd).returncode == 0:
+                    paths = [os.path.join(tmp, f"seg{i}.ts") for i in range(count)]
+                    if all(os.path.exists(path) for path in paths):
+                        segments = []
+                        for path in paths:
+                            with open(path, "rb") as f:
+                                segments.append(f.read())
+        _ts_clips[count] = segments
+        return segments
+
+
+class SyntheticHLSServer:
+    """
+    Local HTTP server generating HLS playlists and segments on the fly.
+
+    - `segments` per rendition, `segment_size` bytes each for the largest
+      rendition (smaller renditions scale down)
+    - `latency` seconds of delay before every response
+    - `error_rate`: share of segment requests answered with a 503
+    - `container`: "ts" or "fmp4" (EXT-X-MAP init section + .m4s fragments)
+    - `encrypted`: AES-128 with a per-rendition key and sequence-number IVs
+    - `byterange`: segments as EXT-X-BYTERANGE slices of one file per rendition
+
+    TS segments hold a real video (see encoded_ts_segments()) padded with
+    null packets to their size; without ffmpeg they are random packets, which
+    only the modes that don't remux can take.
+
+    Segment bodies are deterministic, so expected_sha256() can verify what a
+    downloader produced. `stats` counts requests, bytes sent and injected errors.
+    """
+
+    def __init__(self, segments=100, segment_size=512 * 1024, latency=0.0, error_rate=0.0,
+                 container="ts", encrypted=False, byterange=False, variants=2, seed=0,
+                 host="127.0.0.1", port=0):
+        if container not in ("ts", "fmp4"):
+            raise ValueError(f"Unknown container {container!r}, expected 'ts' or 'fmp4'")
+        if encrypted and Cipher is None:
+            raise RuntimeError("Encrypted streams need the 'cryptography' package")
+        self.segments = segments
+        self.segment_size = segment_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.container = container
+        self.encrypted = encrypted
+        self.byterange = byterange
+        self.variants = variants
+        self.extension = "ts" if container == "ts" else "m4s"
+        self.stats = {"requests": 0, "bytes_sent": 0, "errors_injected": 0}
+
+        rng = random.Random(seed)
+        self._random = rng
+        self._lock = threading.Lock()
+        self._keys = [rng.randbytes(16) for _ in range(variants)]
+        self._encoded = encoded_ts_segments(segments) if container == "ts" else None
+        self._templates = [self._template(rng, self._size(v)) for v in range(variants)]
+        self._joined = {}
+
+        handler = type("Handler", (_Handler,), {"server_state": self})
+        self._httpd = http.server.ThreadingHTTPServer((host, port), handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def url(self):
+        return f"{self.base_url}/master.m3u8"
+
+    def media_url(self, variant=None):
+        return f"{self.base_url}/v{self.variants - 1 if variant is None else variant}/index.m3u8"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # Content
+
+    def _size(self, variant):
+        return max(self.segment_size * (variant + 1) // self.variants, TS_PACKET_SIZE)
+
+    def _template(self, rng, size):
+        if self.container == "ts":
+            packets = -(-size // TS_PACKET_SIZE)
+            data = b"".join(b"\x47" + rng.randbytes(TS_PACKET_SIZE - 1) for _ in range(packets))
+            return data[:size]
+        return rng.randbytes(size)
+
+    def init_section(self, variant):
+        ftyp = _box(b"ftyp", b"isom\x00\x00\x02\x00isomiso6mp41")
+        moov = _box(b"moov", _box(b"mvhd", struct.pack(">I", variant) + b"\x00" * 96))
+        return ftyp + moov
+
+    def plain_segment(self, variant, index):
+        """
+        The decrypted bytes of segment `index` of rendition `variant`.
+        """
+        template = self._templates[variant]
+        stamp = struct.pack(">II", variant, index)
+        if self._encoded is not None:
+            video = self._encoded[index]
+            padding_packets = max(len(template) - len(video), 0) // TS_PACKET_SIZE
+            return video + NULL_PACKET * padding_packets
+        if self.container == "ts":
+            return template[:4] + stamp + template[4 + len(stamp):]
+        moof = _box(b"moof", _box(b"mfhd", b"\x00\x00\x00\x00" + stamp))
+        return moof + _box(b"mdat", template[:max(len(template) - len(moof) - 8, 0)])
+
+    def segment(self, variant, index):
+        """
+        Segment bytes as served (encrypted when `encrypted`).
+        """
+        body = self.plain_segment(variant, index)
+        if not self.encrypted:
+            return body
+        padder = padding.PKCS7(128).padder()
+        iv = index.to_bytes(16, "big")
+        encryptor = Cipher(algorithms.AES(self._keys[variant]), modes.CBC(iv)).encryptor()
+        return encryptor.update(padder.update(body) + padder.finalize()) + encryptor.finalize()
+
+    def _served_length(self, variant, index):
+        length = len(self.plain_segment(variant, index))
+        return (length // 16 + 1) * 16 if self.encrypted else length
+
+    def joined(self, variant):
+        """
+        All segments of a rendition in one file (the EXT-X-BYTERANGE target).
+        """
+        with self._lock:
+            if variant not in self._joined:
+                self._joined[variant] = b"".join(self.segment(variant, i)
+                                                 for i in range(self.segments))
+            return self._joined[variant]
+
+    def expected_sha256(self, variant=None):
+        """
+        SHA-256 of the decrypted stream a downloader should assemble for a
+        rendition (the largest by default): init section (fMP4) + segments.
+        """
+        variant = self.variants - 1 if variant is None else variant
+        digest = hashlib.sha256()
+        if self.container == "fmp4":
+            digest.update(self.init_section(variant))
+        for i in range(self.segments):
+            digest.update(self.plain_segment(variant, i))
+        return digest.hexdigest()
+
+    @property
+    def playable(self):
+        """
+        Whether the segments hold real media (encoded TS) that ffmpeg can remux.
+        """
+        return self._encoded is not None
+
+    def write_expected(self, path, variant=None):
+        """
+        Write the decrypted stream expected_sha256() describes to `path`.
+        """
+        variant = self.variants - 1 if variant is None else variant
+        with open(path, "wb") as f:
+            if self.container == "fmp4":
+                f.write(self.init_section(variant))
+            for i in range(self.segments):
+                f.write(self.plain_segment(variant, i))
+
+    def expected_size(self, variant=None):
+        variant = self.variants - 1 if variant is None else variant
+        size = sum(len(self.plain_segment(variant, i)) for i in range(self.segments))
+        return size + (len(self.init_section(variant)) if self.container == "fmp4" else 0)
+
+    def master_playlist(self):
+        lines = ["#EXTM3U", "#EXT-X-VERSION:6"]
+        for v in range(self.variants):
+            bandwidth = int(self._size(v) * 8 / SEGMENT_DURATION)
+            height = 360 * (v + 1)
+            lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},"
+                         f"RESOLUTION={height * 16 // 9}x{height}")
+            lines.append(f"v{v}/index.m3u8")
+        return "\n".join(lines) + "\n"
+
+    def media_playlist(self, variant):
+        lines = ["#EXTM3U", "#EXT-X-VERSION:7" if self.container == "fmp4" else "#EXT-X-VERSION:4",
+                 f"#EXT-X-TARGETDURATION:{int(SEGMENT_DURATION)}", "#EXT-X-MEDIA-SEQUENCE:0",
+                 "#EXT-X-PLAYLIST-TYPE:VOD"]
+        if self.container == "fmp4":
+            lines.append('#EXT-X-MAP:URI="init.mp4"')
+        if self.encrypted:
+            lines.append('#EXT-X-KEY:METHOD=AES-128,URI="key.bin"')
+        offset = 0
+        for i in range(self.segments):
+            lines.append(f"#EXTINF:{SEGMENT_DURATION:.3f},")
+            if self.byterange:
+                length = self._served_length(variant, i)
+                lines.append(f"#EXT-X-BYTERANGE:{length}@{offset}")
+                lines.append(f"all.{self.extension}")
+                offset += length
+            else:
+                lines.append(f"seg{i}.{self.extension}")
+        lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+    def _inject_error(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.stats["errors_injected"] += 1
+        return failed
+
+    def _count(self, nbytes):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_sent"] += nbytes
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like a CDN
+    server_state = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        state = self.server_state
+        if state.latency:
+            time.sleep(state.latency)
+        path = self.path.split("?")[0]
+
+        if path == "/master.m3u8":
+            return self._send(state.master_playlist().encode(), "application/vnd.apple.mpegurl")
+        match = re.match(r"^/v(\d+)/(.+)$", path)
+        variant = int(match.group(1)) if match else -1
+        if not 0 <= variant < state.variants:
+            return self._send(b"not found", "text/plain", 404)
+        name = match.group(2)
+
+        if name == "index.m3u8":
+            return self._send(state.media_playlist(variant).encode(), "application/vnd.apple.mpegurl")
+        if name == "key.bin" and state.encrypted:
+            return self._send(state._keys[variant], "application/octet-stream")
+        if name == "init.mp4" and state.container == "fmp4":
+            return self._send(state.init_section(variant), "video/mp4")
+
+        segment = re.match(rf"^seg(\d+)\.{state.extension}$", name)
+        joined = name == f"all.{state.extension}" and state.byterange
+        if not (segment and int(segment.group(1)) < state.segments) and not joined:
+            return self._send(b"not found", "text/plain", 404)
+        if state._inject_error():
+            return self._send(b"injected error", "text/plain", 503)
+        content_type = "video/mp2t" if state.container == "ts" else "video/iso.segment"
+        if segment:
+            return self._send(state.segment(variant, int(segment.group(1))), content_type)
+
+        body = state.joined(variant)
+        byte_range = re.match(r"^bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if not byte_range:
+            return self._send(body, content_type)
+        start = int(byte_range.group(1))
+        end = min(int(byte_range.group(2) or len(body) - 1), len(body) - 1)
+        if start > end:
+            return self._send(b"", content_type, 416,
+                              {"Content-Range": f"bytes */{len(body)}"})
+        return self._send(body[start:end + 1], content_type, 206,
+                          {"Content-Range": f"bytes {start}-{end}/{len(body)}"})
+
+    def _send(self, body, content_type, status=200, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Accept-Ranges", "bytes")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server_state._count(len(body))
+
+
+if __name__ == "__main__":
+    # Serve a default synthetic stream until ^C, e.g. to point a downloader at by hand
+    port = int(os.environ.get("HLS_BENCH_PORT", "8765"))
+    with SyntheticHLSServer(port=port) as server:
+        print(f"[i] Serving synthetic HLS at {server.url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
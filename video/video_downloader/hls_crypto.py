@@ -0,0 +1,125 @@
+import tempfile
+import threading
+from urllib.parse import urljoin
+
+from hls_fetch import READ_CHUNK_SIZE, SPOOL_MAX_BYTES
+from hls_plan import is_fmp4
+
+try:
+    from cryptography.hazmat.primitives import padding
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:  # only needed for AES-128 playlists
+    Cipher = None
+
+# EXT-X-KEY methods we can handle. AES-128 is decrypted in the fetch workers;
+# SAMPLE-AES segments are kept as-is and decrypted by ffmpeg's HLS demuxer.
+SUPPORTED_METHODS = ("AES-128", "SAMPLE-AES")
+
+
+def _keyformat(key):
+    return (getattr(key, "keyformat", None) or "identity").lower()
+
+
+def encryption_method(playlist):
+    """
+    Return "AES-128", "SAMPLE-AES" or None for a media playlist. Raises
+    ValueError for DRM key formats or methods that can't be decrypted here.
+    """
+    methods = set()
+    for key in playlist.keys:
+        if key is None or (key.method or "NONE").upper() == "NONE":
+            continue
+        method = key.method.upper()
+        if method not in SUPPORTED_METHODS or _keyformat(key) != "identity":
+            raise ValueError(f"Unsupported encryption: METHOD={key.method}, "
+                             f"KEYFORMAT={_keyformat(key)} (DRM-protected?)")
+        methods.add(method)
+    if len(methods) > 1:
+        raise ValueError("Playlist mixes AES-128 and SAMPLE-AES segments")
+    return methods.pop() if methods else None
+
+
+class KeyCache:
+    """
+    Fetches each key URI once per job, even when several workers ask at once.
+    """
+
+    def __init__(self, session, timeout=10):
+        self.session = session
+        self.timeout = timeout
+        self._keys = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key_url):
+        with self._lock:
+            if key_url in self._keys:
+                return self._keys[key_url]
+            lock = self._locks.setdefault(key_url, threading.Lock())
+        with lock:
+            if key_url not in self._keys:
+                r = self.session.fetch(key_url, timeout=self.timeout)
+                if len(r.content) != 16:
+                    raise ValueError(f"Key at {key_url} is {len(r.content)} bytes, expected 16")
+                self._keys[key_url] = r.content
+        return self._keys[key_url]
+
+
+def segment_iv(key, sequence):
+    """
+    The IV from EXT-X-KEY, or the media sequence number as a 128-bit big-endian
+    integer when the playlist doesn't give one (RFC 8216, 5.2).
+    """
+    if key.iv:
+        return bytes.fromhex(key.iv[2:] if key.iv.lower().startswith("0x") else key.iv)
+    return sequence.to_bytes(16, "big")
+
+
+class SegmentDecryptor:
+    """
+    fetch_segments() transform that AES-128-CBC decrypts each media segment in
+    the worker thread that fetched it, so decryption overlaps with the other
+    workers' network I/O instead of serializing after the download.
+    Init sections are passed through: packagers leave EXT-X-MAP data in the clear.
+    """
+
+    def __init__(self, plan, base_url, key_cache):
+        if Cipher is None:
+            raise RuntimeError("AES-128 playlists need the 'cryptography' package "
+                               "(pip install cryptography)")
+        self.plan = plan
+        self.base_url = base_url
+        self.key_cache = key_cache
+
+    def __call__(self, index, body):
+        item = self.plan[index]
+        key = item.segment.key
+        if item.kind != "segment" or key is None or (key.method or "").upper() != "AES-128":
+            return body
+
+        key_bytes = self.key_cache.get(urljoin(self.base_url, key.uri))
+        decryptor = Cipher(algorithms.AES(key_bytes), modes.CBC(segment_iv(key, item.sequence))).decryptor()
+        unpadder = padding.PKCS7(128).unpadder()
+        out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        for chunk in iter(lambda: body.read(READ_CHUNK_SIZE), b""):
+            out.write(unpadder.update(decryptor.update(chunk)))
+        out.write(unpadder.update(decryptor.finalize()) + unpadder.finalize())
+        body.close()
+        out.seek(0)
+        return out
+
+
+def setup_decryption(session, playlist, plan, base_url, key_cache=None):
+    """
+    Inspect a media playlist's EXT-X-KEY tags and return
+    (method, transform, key_cache): `transform` is a SegmentDecryptor for
+    AES-128 and None otherwise. Raises ValueError / RuntimeError when the
+    stream can't be decrypted here.
+    """
+    method = encryption_method(playlist)
+    key_cache = key_cache or KeyCache(session)
+    if method == "AES-128":
+        return method, SegmentDecryptor(plan, base_url, key_cache), key_cache
+    if method == "SAMPLE-AES" and is_fmp4(playlist):
+        raise ValueError("SAMPLE-AES (cbcs) in fMP4 segments isn't supported")
+    return method, None, key_cache
@@ -0,0 +1,173 @@
+import os
+
+from hls_fetch import DEFAULT_CONCURRENCY, TransferStats, create_session, fetch_segments
+from hls_assembler import open_assembler
+from hls_crypto import setup_decryption
+from hls_live import is_live, record_live
+from hls_plan import build_plan, clip_range, is_fmp4
+from hls_playlist import load_playlist
+from hls_variants import select_variant
+from forgehub.store import shared_store
+
+# Content types finished outputs are stored under, by file extension; a
+# stored output is linked back under the extension of its type
+OUTPUT_TYPES = {".mp4": "video/mp4", ".ts": "video/mp2t"}
+
+
+def _link_stored(store, url, derived, output_folder, output_name):
+    """
+    Link the output a previous download of `url` made with the same settings
+    (`derived`) into `output_folder`; returns its path, or None if the media
+    store doesn't have one.
+    """
+    entry = store.lookup(url, derived)
+    if entry is None:
+        return None
+    extension = next((ext for ext, content_type in OUTPUT_TYPES.items()
+                      if content_type == entry["content_type"]), None)
+    if extension is None:
+        return None
+    return store.materialize(entry["digest"], os.path.join(output_folder, output_name + extension))
+
+
+def download_hls_stream(m3u8_url, output_folder, output_name, concurrency=DEFAULT_CONCURRENCY,
+                        output_mode="segments", variant_policy="highest", max_height=None,
+                        max_bandwidth=None, max_duration=None, clip_start=None, clip_end=None,
+                        budget=None, ffmpeg_loglevel="error"):
+    """
+    Download one HLS stream into `output_folder`; returns the output path, or
+    None if it failed. The download scripts call this with their settings.
+
+    - output_mode: "segments" (per-segment files + concat), "stream" (single
+      .ts) or "pipe" (ffmpeg → .mp4); fMP4 and SAMPLE-AES streams pick their own
+    - variant_policy / max_height / max_bandwidth: rendition choice for master
+      playlists (see hls_variants.select_variant)
+    - max_duration: seconds a live playlist is recorded for at most
+    - clip_start / clip_end: seconds from the start of the stream; only the
+      segments covering the clip are fetched
+    - budget: a BandwidthBudget shared with other streams, if any
+    """
+    print(f"\n[+] Downloading from: {m3u8_url}")
+
+    # 🗃️ Same stream with the same settings made before (by any run, from any
+    # page): link it, fetch nothing. Keyed on the URL asked for, since the
+    # rendition and keys are only known after the probe and key requests.
+    requested_url = m3u8_url
+    store = shared_store()
+    derived = (f"hls:{output_mode}:{clip_start}-{clip_end}:"
+               f"{variant_policy}:{max_height}:{max_bandwidth}")
+    stored = _link_stored(store, requested_url, derived, output_folder, output_name)
+    if stored:
+        print(f"[✓] Already downloaded, linked from the media store: {stored}")
+        return stored
+
+    session = create_session(concurrency=concurrency, budget=budget, job=output_name)
+
+    try:
+        r = session.fetch(m3u8_url, timeout=10)
+    except Exception as e:
+        print(f"[-] Failed to fetch playlist: {e}")
+        return
+
+    prefetched = {}
+    try:
+        playlist = load_playlist(r.text, m3u8_url)
+        if playlist.is_variant:
+            choice = select_variant(session, m3u8_url, playlist, variant_policy,
+                                    max_height, max_bandwidth, concurrency)
+            m3u8_url, playlist, prefetched = choice.url, choice.playlist, choice.prefetched
+    except Exception as e:
+        print(f"[-] Error parsing playlist: {e}")
+        print("[!] Partial content for debug:")
+        print(r.text[:500])
+        return
+
+    if not playlist.segments:
+        print("[-] No segments found in the playlist. Possibly an empty stream.")
+        print("[!] Here’s a snippet of the playlist:")
+        print(playlist.dumps()[:500])
+        return
+
+    # 🔴 Live playlist: keep refreshing and appending new segments
+    if is_live(playlist):
+        if clip_start is not None or clip_end is not None:
+            print("[!] Clip range ignored for live playlists (see max_duration).")
+        final_output = record_live(session, m3u8_url, playlist, output_folder, output_name,
+                                   output_mode, concurrency, max_duration)
+        if final_output:
+            print(f"[✓] Recording saved as: {final_output}")
+        return final_output
+
+    # ✂️ Clip: fetch only the segments covering [clip_start, clip_end)
+    first, stop, trim = 0, None, None
+    if clip_start is not None or clip_end is not None:
+        first, stop, offset, duration = clip_range(playlist, clip_start, clip_end)
+        clip = f"{clip_start or 0}s-{'end' if clip_end is None else f'{clip_end}s'}"
+        if first >= stop:
+            print(f"[-] Clip {clip} is outside the stream.")
+            return
+        trim = (offset, duration)
+        print(f"[i] Clip {clip}: segments {first + 1}-{stop} of {len(playlist.segments)}.")
+        # Segments the variant probe fetched are numbered in the full playlist's plan
+        for result in prefetched.values():
+            result.close()
+        prefetched = {}
+
+    plan = build_plan(playlist, m3u8_url, first, stop=stop)
+    seg_urls = [item.url for item in plan]
+    seg_ranges = [item.byterange for item in plan]
+
+    # 🎞️ fMP4/CMAF: init section + fragments already form an .mp4, no ffmpeg needed
+    if is_fmp4(playlist):
+        print("[i] fMP4/CMAF playlist detected, appending fragments directly.")
+        output_mode = "fmp4"
+
+    # 🔐 AES-128 is decrypted in the fetch workers, SAMPLE-AES by ffmpeg at merge time
+    try:
+        method, decrypt, key_cache = setup_decryption(session, playlist, plan, m3u8_url)
+    except (ValueError, RuntimeError) as e:
+        print(f"[-] Can't decrypt this stream: {e}")
+        return
+    assembler_options = {}
+    if method == "SAMPLE-AES":
+        output_mode = "sample-aes"
+        assembler_options = {"plan": plan, "base_url": m3u8_url, "key_cache": key_cache}
+
+    stats = TransferStats()
+    failed = 0
+
+    with open_assembler(output_mode, output_folder, output_name, ffmpeg_loglevel=ffmpeg_loglevel,
+                        trim=trim, **assembler_options) as assembler:
+        # ⏯️ Skip segments a previous (interrupted) run already verified
+        done = assembler.resume(seg_urls)
+        if done:
+            print(f"[i] Resuming: {len(done)}/{len(seg_urls)} segments already on disk.")
+
+        for result in fetch_segments(seg_urls, session, concurrency, stats=stats,
+                                     skip=done, prefetched=prefetched, transform=decrypt,
+                                     ranges=seg_ranges):
+            i = result.index
+            if not result.ok:
+                print(f"[-] Failed segment {i}: {result.error}")
+                failed += 1
+                if assembler.in_order:
+                    break
+                continue
+            assembler.write(result)
+            result.close()
+            print(f"[✓] Segment {i+1}/{len(seg_urls)} downloaded.")
+
+        print(f"[i] Throughput: {stats.summary()}")
+
+        if failed:
+            print(f"[!] {failed} segments missing. Rerun to fetch only those.")
+            return
+
+        final_output = assembler.finish()
+        if final_output:
+            content_type = OUTPUT_TYPES.get(os.path.splitext(final_output)[1])
+            store.adopt(requested_url, final_output, derived, content_type)
+
+    if final_output:
+        print(f"[✓] Merged video saved as: {final_output}")
+    return final_output
@@ -0,0 +1,332 @@
+import time
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from forgehub.client import HttpClient
+
+# Number of segments fetched at once when the caller doesn't say otherwise
+DEFAULT_CONCURRENCY = 8
+# Segment bodies larger than this spill from memory to a temp file while they
+# wait in the reorder window, so peak memory doesn't grow with segment size
+SPOOL_MAX_BYTES = 2 * 1024 * 1024
+READ_CHUNK_SIZE = 256 * 1024
+# Adjacent EXT-X-BYTERANGE segments of one file are merged into Range
+# requests of up to this many bytes
+COALESCE_MAX_BYTES = 8 * 1024 * 1024
+
+
+class SegmentResult:
+    """
+    Outcome of one segment fetch: either `body` or `error` is set.
+
+    `body` is a spooled temp file positioned at 0 holding `size` bytes; it lives
+    in memory up to SPOOL_MAX_BYTES and on disk beyond that.
+    """
+    __slots__ = ("index", "url", "body", "size", "error", "elapsed")
+
+    def __init__(self, index, url, body=None, size=0, error=None, elapsed=0.0):
+        self.index = index
+        self.url = url
+        self.body = body
+        self.size = size
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def read(self):
+        """
+        Return the whole body as bytes (for small payloads like keys or playlists).
+        """
+        self.body.seek(0)
+        return self.body.read()
+
+    def close(self):
+        if self.body is not None:
+            self.body.close()
+
+
+class TransferStats:
+    """
+    Thread-safe byte/segment/request counters used for the end-of-run summary.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.segments = 0
+        self.requests = 0
+        self.failed = 0
+        self.bytes = 0
+
+    def add(self, nbytes, segments=1):
+        with self._lock:
+            self.segments += segments
+            self.requests += 1
+            self.bytes += nbytes
+
+    def fail(self):
+        with self._lock:
+            self.failed += 1
+
+    def summary(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        mb = self.bytes / (1024 * 1024)
+        return (f"{self.segments} segments ({self.requests} requests), {mb:.1f} MB in {elapsed:.1f}s "
+                f"({mb / elapsed:.2f} MB/s, {self.segments / elapsed:.1f} seg/s, "
+                f"{self.failed} failed)")
+
+
+class BandwidthBudget:
+    """
+    Token bucket shared by every session that downloads under one total
+    bandwidth cap (bytes/s). Readers call consume() per chunk and sleep when
+    the bucket runs dry, so concurrent streams split the budget between them.
+    """
+
+    def __init__(self, bytes_per_second, burst=None):
+        self.rate = float(bytes_per_second)
+        self.capacity = float(burst or max(bytes_per_second, READ_CHUNK_SIZE))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # Go into debt rather than split the chunk; the next reader pays it off
+            self._tokens -= nbytes
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+def create_session(headers=None, concurrency=DEFAULT_CONCURRENCY, budget=None, job=None):
+    """
+    Build a forgehub HttpClient whose per-host pool fits `concurrency` workers.
+    Segment reads through it are throttled by `budget` (a BandwidthBudget), if given.
+    Its requests are labelled `job` in telemetry.
+    """
+    session = HttpClient(headers, pool_maxsize=concurrency, job=job)
+    session.budget = budget
+    return session
+
+
+def _apply_transform(result, transform):
+    """
+    Run `transform(index, body) -> body` (e.g. decryption) on a fetched segment.
+    """
+    if transform is None or not result.ok:
+        return result
+    try:
+        result.body = transform(result.index, result.body)
+    except Exception as e:
+        result.close()
+        result.body, result.error = None, e
+        return result
+    result.size = result.body.seek(0, 2)
+    result.body.seek(0)
+    return result
+
+
+class _BodyReader:
+    """
+    Reads exact byte counts out of a streamed response, so one coalesced
+    Range response can be split back into its segments.
+    """
+
+    def __init__(self, resp, budget=None):
+        self._chunks = resp.iter_content(READ_CHUNK_SIZE)
+        self._buffer = b""
+        self._budget = budget
+
+    def _next(self):
+        if self._buffer:
+            chunk, self._buffer = self._buffer, b""
+            return chunk
+        chunk = next(self._chunks, b"")
+        if chunk and self._budget is not None:
+            self._budget.consume(len(chunk))
+        return chunk
+
+    def copy(self, out, nbytes=None):
+        """
+        Copy `nbytes` (or everything left, if None) into `out`; returns bytes copied.
+        """
+        copied = 0
+        while nbytes is None or copied < nbytes:
+            chunk = self._next()
+            if not chunk:
+                break
+            if nbytes is not None and copied + len(chunk) > nbytes:
+                chunk, self._buffer = chunk[:nbytes - copied], chunk[nbytes - copied:]
+            if out is not None:
+                out.write(chunk)
+            copied += len(chunk)
+        return copied
+
+
+def _read_group(session, group, timeout, headers):
+    """
+    One attempt at a request group; returns the spooled bodies in group order.
+    """
+    url = group[0][1]
+    first_range = group[0][2]
+    bodies = []
+    try:
+        with session.get(url, timeout=timeout, stream=True, headers=headers) as resp:
+            resp.raise_for_status()
+            reader = _BodyReader(resp, getattr(session, "budget", None))
+            if first_range is not None and resp.status_code != 206:
+                # Server ignored Range and sent the whole file
+                reader.copy(None, first_range[0])
+            for index, _, byterange in group:
+                body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+                bodies.append(body)
+                wanted = byterange[1] if byterange is not None else None
+                size = reader.copy(body, wanted)
+                if wanted is not None and size != wanted:
+                    raise IOError(f"Short read for segment {index}: {size}/{wanted} bytes")
+    except Exception:
+        for body in bodies:
+            body.close()
+        raise
+    return bodies
+
+
+def _fetch_group(session, group, timeout, stats, transform=None):
+    """
+    Fetch one request's worth of segments: a single segment, or a run of
+    adjacent byte ranges of the same URL fetched with one Range request.
+    `group` is a list of (index, url, (offset, length) or None).
+    Transient failures are retried (see forgehub.retry) before the group
+    is reported as failed.
+    """
+    start = time.perf_counter()
+    url = group[0][1]
+    first_range = group[0][2]
+    headers = None
+    if first_range is not None:
+        last_offset, last_length = group[-1][2]
+        headers = {"Range": f"bytes={first_range[0]}-{last_offset + last_length - 1}"}
+
+    try:
+        bodies = session.call(url, lambda: _read_group(session, group, timeout, headers))
+    except Exception as e:
+        stats.fail()
+        elapsed = time.perf_counter() - start
+        return [SegmentResult(index, url, error=e, elapsed=elapsed) for index, _, _ in group]
+
+    elapsed = time.perf_counter() - start
+    results = []
+    for (index, _, _), body in zip(group, bodies):
+        size = body.tell()
+        body.seek(0)
+        results.append(SegmentResult(index, url, body, size, elapsed=elapsed))
+    stats.add(sum(r.size for r in results), len(results))
+    return [_apply_transform(r, transform) for r in results]
+
+
+def _plan_requests(urls, ranges, skip, prefetched):
+    """
+    Yield ("prefetched", index) markers and request groups (see _fetch_group)
+    in playlist order, merging adjacent byte ranges of the same URL.
+    """
+    group = []
+    group_bytes = 0
+    for index, url in enumerate(urls):
+        byterange = ranges[index] if ranges else None
+        if index in skip or index in prefetched:
+            if group:
+                yield group
+                group, group_bytes = [], 0
+            # Skipped wins: a segment already on disk isn't written again
+            if index not in skip:
+                yield ("prefetched", index)
+            continue
+        if group and byterange is not None:
+            _, last_url, last_range = group[-1]
+            if (last_url == url and last_range is not None
+                    and last_range[0] + last_range[1] == byterange[0]
+                    and group_bytes + byterange[1] <= COALESCE_MAX_BYTES):
+                group.append((index, url, byterange))
+                group_bytes += byterange[1]
+                continue
+        if group:
+            yield group
+        group = [(index, url, byterange)]
+        group_bytes = byterange[1] if byterange is not None else 0
+    if group:
+        yield group
+
+
+def fetch_segments(urls, session, concurrency=DEFAULT_CONCURRENCY, timeout=10, stats=None,
+                   skip=(), prefetched=None, transform=None, ranges=None):
+    """
+    Fetch `urls` with a bounded worker pool and yield SegmentResult objects in
+    playlist order. The window of futures doubles as the reorder buffer: at most
+    `2 * concurrency` requests are in flight or waiting to be consumed, each
+    spooled with bounded memory, however long the playlist is.
+    Indices in `skip` (e.g. segments already on disk) are not fetched or yielded;
+    results in `prefetched` (index -> SegmentResult) are yielded without a fetch.
+    `transform(index, body) -> body` runs in the worker right after each fetch,
+    so CPU work such as decryption overlaps with the other workers' downloads.
+    `ranges` optionally gives an (offset, length) EXT-X-BYTERANGE per URL;
+    adjacent ranges of one URL are fetched with a single Range request of up to
+    COALESCE_MAX_BYTES.
+    The caller owns each yielded result and should close() it once consumed.
+    """
+    concurrency = max(int(concurrency), 1)
+    stats = stats if stats is not None else TransferStats()
+    window = concurrency * 2
+    pending = deque()
+    prefetched = prefetched or {}
+    for index in [index for index in prefetched if index in skip]:
+        prefetched.pop(index).close()
+    request_groups = _plan_requests(urls, ranges, skip, prefetched)
+
+    def _reuse(result):
+        return [_apply_transform(result, transform)]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        def submit_next():
+            for group in request_groups:
+                if group[0] == "prefetched":
+                    pending.append(pool.submit(_reuse, prefetched.pop(group[1])))
+                else:
+                    pending.append(pool.submit(_fetch_group, session, group, timeout, stats,
+                                               transform))
+                return True
+            return False
+
+        for _ in range(window):
+            if not submit_next():
+                break
+
+        results = deque()
+        try:
+            while pending:
+                results = deque(pending.popleft().result())
+                submit_next()
+                while results:
+                    yield results.popleft()
+        finally:
+            # Consumer stopped early (error or ^C): drop whatever is queued, let
+            # running fetches finish and close every result nobody will consume
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=True)
+            for result in results:
+                result.close()
+            for future in pending:
+                if not future.cancelled() and future.exception() is None:
+                    for result in future.result():
+                        result.close()
+            for result in prefetched.values():
+                result.close()
@@ -0,0 +1,94 @@
+import os
+import json
+import hashlib
+
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    """
+    Return the hex SHA-256 of a file on disk.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SegmentJournal:
+    """
+    Append-only JSON-lines record of the segments a job has finished.
+
+    Each line holds {"index", "uri", "size", "sha256"} plus any extra fields the
+    writer needs (e.g. "offset" into a single output file). On restart the journal
+    is replayed so verified segments can be skipped and only the missing or
+    corrupt ones are fetched again. A torn last line (e.g. after ^C) is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[entry["index"]] = entry
+        # Opened on the first record, so a job that writes nothing leaves no file
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def is_verified(self, index, uri, segment_path):
+        """
+        True when `segment_path` matches the journaled size and checksum for
+        this index and the segment still points at the same URI.
+        """
+        entry = self.entries.get(index)
+        if not entry or entry["uri"] != uri:
+            return False
+        try:
+            if os.path.getsize(segment_path) != entry["size"]:
+                return False
+            return sha256_file(segment_path) == entry["sha256"]
+        except OSError:
+            return False
+
+    def record(self, index, uri, size, sha256, **extra):
+        """
+        Journal a segment whose bytes have just been written to disk.
+        """
+        entry = {"index": index, "uri": uri, "size": size, "sha256": sha256, **extra}
+        self.entries[index] = entry
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def rewrite(self, entries):
+        """
+        Replace the journal with `entries` (used to drop records that no longer
+        match the output on disk).
+        """
+        self.close()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+        self.entries = {entry["index"]: entry for entry in entries}
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
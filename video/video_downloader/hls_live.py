@@ -0,0 +1,130 @@
+import time
+import signal
+import threading
+
+from hls_assembler import open_assembler
+from hls_crypto import KeyCache, setup_decryption
+from hls_fetch import TransferStats, fetch_segments
+from hls_plan import build_plan, init_key, is_fmp4
+from hls_playlist import reload_playlist
+
+# Fallback refresh interval when a live playlist has no EXT-X-TARGETDURATION
+DEFAULT_TARGET_DURATION = 6
+
+
+def is_live(playlist):
+    """
+    A media playlist without EXT-X-ENDLIST is still being appended to.
+    """
+    return bool(playlist.segments) and not playlist.is_endlist
+
+
+class _StopFlag:
+    """
+    Set by SIGTERM (or ^C) so the recorder can finish the current batch and
+    close the output cleanly instead of dying mid-write.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self._previous = None
+
+    def __enter__(self):
+        if threading.current_thread() is threading.main_thread():
+            self._previous = signal.signal(signal.SIGTERM, lambda *_: self.event.set())
+        return self
+
+    def __exit__(self, *exc):
+        if self._previous is not None:
+            signal.signal(signal.SIGTERM, self._previous)
+
+
+def record_live(session, playlist_url, playlist, output_folder, output_name, output_mode="stream",
+                concurrency=4, max_duration=None, timeout=10):
+    """
+    Record a live media playlist until EXT-X-ENDLIST, `max_duration` seconds of
+    wall time, SIGTERM or ^C. Returns the output path (or None on failure).
+
+    The playlist is re-fetched every EXT-X-TARGETDURATION (half that when it
+    hasn't changed, as the HLS spec suggests). Only segments whose media sequence
+    number is above the last one written are fetched, so each refresh costs one
+    playlist request plus the new segments, however long the recording runs.
+    """
+    if output_mode == "segments":
+        # Per-segment files + concat can't grow while recording
+        output_mode = "stream"
+    if is_fmp4(playlist):
+        output_mode = "fmp4"
+
+    key_cache = KeyCache(session, timeout)
+    stats = TransferStats()
+    started = time.monotonic()
+    last_seq = None
+    current_init = None
+    written = 0
+    output = None
+
+    with _StopFlag() as stop, open_assembler(output_mode, output_folder, output_name) as assembler:
+        # A live recording can't be resumed: previously listed segments are gone
+        assembler.resume([])
+        print(f"[i] Live playlist: recording to {assembler.output_path} "
+              f"(stop with ^C{f' or after {max_duration}s' if max_duration else ''}).")
+        try:
+            while True:
+                first_seq = playlist.media_sequence or 0
+                if last_seq is not None and first_seq > last_seq + 1:
+                    print(f"[!] Fell behind the live window: {first_seq - last_seq - 1} segments lost.")
+                start = 0 if last_seq is None else max(last_seq + 1 - first_seq, 0)
+                new = playlist.segments[start:]
+
+                if new:
+                    plan = build_plan(playlist, playlist_url, start, current_init)
+                    method, decrypt, _ = setup_decryption(session, playlist, plan,
+                                                          playlist_url, key_cache)
+                    if method == "SAMPLE-AES":
+                        raise ValueError("Live SAMPLE-AES recording isn't supported")
+                    for result in fetch_segments([item.url for item in plan], session,
+                                                 concurrency, timeout, stats,
+                                                 transform=decrypt,
+                                                 ranges=[item.byterange for item in plan]):
+                        if not result.ok:
+                            print(f"[-] Failed live segment: {result.error}")
+                            continue
+                        item = plan[result.index]
+                        if item.kind == "init":
+                            current_init = init_key(item.segment.init_section)
+                        result.index = written
+                        assembler.write(result)
+                        result.close()
+                        written += 1
+                    last_seq = first_seq + len(playlist.segments) - 1
+                    print(f"[✓] Live: +{len(new)} segments (last sequence {last_seq}), "
+                          f"{stats.bytes / (1024 * 1024):.1f} MB so far")
+
+                if playlist.is_endlist:
+                    print("[i] EXT-X-ENDLIST reached, stream finished.")
+                    break
+                if max_duration and time.monotonic() - started >= max_duration:
+                    print("[i] Duration limit reached.")
+                    break
+
+                target = playlist.target_duration or DEFAULT_TARGET_DURATION
+                if stop.event.wait(target if new else target / 2):
+                    print("[i] Stop requested.")
+                    break
+
+                try:
+                    r = session.get(playlist_url, timeout=timeout)
+                    r.raise_for_status()
+                    playlist = reload_playlist(playlist, r.text, playlist_url)
+                except Exception as e:
+                    print(f"[-] Playlist refresh failed, retrying: {e}")
+        except KeyboardInterrupt:
+            print("\n[i] Interrupted, closing recording.")
+        except (ValueError, RuntimeError) as e:
+            print(f"[-] Can't decrypt this stream: {e}")
+
+        print(f"[i] Recorded {stats.summary()}")
+        if written:
+            output = assembler.finish()
+    return output
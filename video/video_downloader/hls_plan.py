@@ -0,0 +1,110 @@
+from urllib.parse import urljoin, urlparse
+
+# Segment extensions that mean fragmented MP4 / CMAF rather than MPEG-TS
+FMP4_EXTENSIONS = (".m4s", ".mp4", ".m4v", ".m4a", ".cmfv", ".cmfa")
+
+
+class PlanItem:
+    """
+    One object to fetch for a media playlist, in output order: either an
+    EXT-X-MAP init section ("init") or a media segment ("segment").
+    `sequence` is the segment's media sequence number (the default AES IV) and
+    `byterange` an absolute (offset, length) for EXT-X-BYTERANGE items, else None.
+    """
+    __slots__ = ("url", "kind", "segment", "sequence", "byterange")
+
+    def __init__(self, url, kind, segment, sequence, byterange=None):
+        self.url = url
+        self.kind = kind
+        self.segment = segment
+        self.sequence = sequence
+        self.byterange = byterange
+
+
+def is_fmp4(playlist):
+    """
+    True for fMP4/CMAF media playlists (EXT-X-MAP present or .m4s-style segments).
+    """
+    if not playlist.segments:
+        return False
+    if any(seg.init_section is not None for seg in playlist.segments):
+        return True
+    return urlparse(playlist.segments[0].uri).path.lower().endswith(FMP4_EXTENSIONS)
+
+
+def parse_byterange(value, default_offset=0):
+    """
+    Turn an EXT-X-BYTERANGE / BYTERANGE value "<length>[@<offset>]" into
+    (offset, length); a missing offset continues from `default_offset`.
+    """
+    length, _, offset = str(value).partition("@")
+    return (int(offset) if offset else default_offset, int(length))
+
+
+def init_key(init_section):
+    """
+    Identity of an EXT-X-MAP, used to spot when the init section changes.
+    """
+    return (init_section.uri, init_section.byterange)
+
+
+def clip_range(playlist, clip_start=None, clip_end=None):
+    """
+    Segments covering the time window [clip_start, clip_end) in seconds from
+    the start of the playlist, going by cumulative EXTINF durations.
+    Returns (first, stop, offset, duration): the segment indices to fetch
+    (first up to stop, exclusive), where clip_start falls within the first of
+    them, and the clip length (None: to the end). first == stop when the
+    window misses the stream.
+    """
+    clip_start = max(clip_start or 0, 0)
+    first = stop = None
+    elapsed = first_start = 0
+    for i, seg in enumerate(playlist.segments):
+        seg_start, elapsed = elapsed, elapsed + (seg.duration or 0)
+        if first is None and elapsed > clip_start:
+            first, first_start = i, seg_start
+        if clip_end is not None and seg_start >= clip_end:
+            stop = i
+            break
+    if first is None:
+        return 0, 0, 0, None
+    stop = len(playlist.segments) if stop is None else max(stop, first)
+    duration = clip_end - clip_start if clip_end is not None else None
+    return first, stop, clip_start - first_start, duration
+
+
+def build_plan(playlist, base_url, start=0, current_init=None, stop=None):
+    """
+    Flatten a media playlist into PlanItems. Each init section is emitted once,
+    right before the first segment that uses it, and again only if the map changes
+    (e.g. after a discontinuity), so appending the items in order yields a
+    playable fragmented MP4 without any remux.
+
+    `start` skips segments already handled (e.g. on a live refresh), `stop`
+    ends the plan before that segment index (e.g. for a clip) and
+    `current_init` is the init_key() already written to the output, if any.
+    """
+    plan = []
+    first_sequence = playlist.media_sequence or 0
+    # End of the previous sub-range per URL, for byte ranges without an offset
+    range_ends = {}
+    for i, seg in enumerate(playlist.segments):
+        if stop is not None and i >= stop:
+            break
+        url = urljoin(base_url, seg.uri)
+        byterange = None
+        if seg.byterange:
+            byterange = parse_byterange(seg.byterange, range_ends.get(url, 0))
+            range_ends[url] = byterange[0] + byterange[1]
+        if i < start:
+            continue
+
+        init = seg.init_section
+        if init is not None and init_key(init) != current_init:
+            init_range = parse_byterange(init.byterange) if init.byterange else None
+            plan.append(PlanItem(urljoin(base_url, init.uri), "init", seg, first_sequence + i,
+                                 init_range))
+            current_init = init_key(init)
+        plan.append(PlanItem(url, "segment", seg, first_sequence + i, byterange))
+    return plan
@@ -0,0 +1,324 @@
+import re
+from array import array
+from itertools import islice
+
+import m3u8
+
+# Tags this reader doesn't model; playlists using them go through m3u8.loads()
+# (master playlists, LL-HLS parts / delta updates, variable substitution)
+FALLBACK_TAGS = ("#EXT-X-STREAM-INF", "#EXT-X-I-FRAME-STREAM-INF", "#EXT-X-MEDIA:",
+                 "#EXT-X-SESSION-", "#EXT-X-PART:", "#EXT-X-PRELOAD-HINT", "#EXT-X-SKIP",
+                 "#EXT-X-DEFINE")
+
+_ATTRIBUTE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+# A URI line: anything that isn't blank or a tag / comment
+_URI_LINE = re.compile(r"^[ \t]*[^#\s][^\r\n]*", re.M)
+
+
+class UnsupportedPlaylist(ValueError):
+    """
+    The playlist uses tags only the full m3u8 parser handles.
+    """
+
+
+class NotAPlaylist(ValueError):
+    """
+    The text doesn't start with #EXTM3U (e.g. an HTML error page).
+    """
+
+
+def _check_header(text):
+    if not text.lstrip("\ufeff \t\r\n").startswith("#EXTM3U"):
+        raise NotAPlaylist("missing #EXTM3U header")
+
+
+def _attributes(value):
+    return {k: v[1:-1] if v.startswith('"') else v for k, v in _ATTRIBUTE.findall(value)}
+
+
+class Key:
+    """
+    EXT-X-KEY, with the attribute names m3u8.Key uses.
+    """
+    __slots__ = ("method", "uri", "iv", "keyformat", "keyformatversions")
+
+    def __init__(self, method, uri=None, iv=None, keyformat=None, keyformatversions=None):
+        self.method = method
+        self.uri = uri
+        self.iv = iv
+        self.keyformat = keyformat
+        self.keyformatversions = keyformatversions
+
+
+class InitSection:
+    """
+    EXT-X-MAP, with the attribute names m3u8.InitializationSection uses.
+    """
+    __slots__ = ("uri", "byterange")
+
+    def __init__(self, uri, byterange=None):
+        self.uri = uri
+        self.byterange = byterange
+
+
+class Segment:
+    """
+    One media segment, built on demand from MediaPlaylist's compact storage.
+    `byterange` is always "<length>@<offset>" (offsets are resolved while parsing).
+    """
+    __slots__ = ("uri", "duration", "byterange", "key", "init_section", "sequence",
+                 "discontinuity")
+
+    def __init__(self, uri, duration, byterange, key, init_section, sequence, discontinuity):
+        self.uri = uri
+        self.duration = duration
+        self.byterange = byterange
+        self.key = key
+        self.init_section = init_section
+        self.sequence = sequence
+        self.discontinuity = discontinuity
+
+
+class _SegmentList:
+    """
+    Sequence view over a MediaPlaylist's segments; records are created as they're read.
+    """
+
+    def __init__(self, playlist):
+        self._playlist = playlist
+
+    def __len__(self):
+        return len(self._playlist._durations)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._playlist._segment(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("segment index out of range")
+        return self._playlist._segment(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._playlist._segment(i)
+
+
+class MediaPlaylist:
+    """
+    Lightweight media playlist reader: one pass over the lines, segments kept
+    in parallel arrays (URI strings are shared, keys and maps stored once),
+    and Segment records only created when read. Offers the parts of the
+    m3u8.M3U8 interface the downloader uses (segments, keys, media_sequence,
+    target_duration, is_endlist, is_variant, dumps()).
+
+    refresh() takes a newer copy of a live playlist and parses only what
+    follows the last segment already known.
+    """
+    is_variant = False
+
+    def __init__(self, text, uri=None):
+        _check_header(text)
+        self.base_uri = uri
+        self._reset()
+        self._parse(text, 0)
+
+    def _reset(self):
+        self.media_sequence = 0
+        self.target_duration = None
+        self.is_endlist = False
+        self.playlist_type = None
+        self._uris = []
+        self._durations = array("d")
+        self._range_offsets = array("q")
+        self._range_lengths = array("q")   # -1: no byte range
+        self._key_ids = array("I")         # index into _key_table (0: not encrypted)
+        self._map_ids = array("I")         # index into _map_table (0: no EXT-X-MAP)
+        self._discontinuities = bytearray()
+        self._key_table = [None]
+        self._map_table = [None]
+        self._interned = {}
+        self._table_ids = {}               # (tag, attribute text) -> table index
+        # Parser state carried across refresh() calls
+        self._key_id = 0
+        self._map_id = 0
+        self._range_ends = {}
+
+    @property
+    def segments(self):
+        return _SegmentList(self)
+
+    @property
+    def keys(self):
+        """
+        Distinct keys in use, None standing for unencrypted segments (as in m3u8).
+        """
+        return [self._key_table[i] for i in sorted(set(self._key_ids))]
+
+    def _segment(self, i):
+        length = self._range_lengths[i]
+        return Segment(self._uris[i], self._durations[i],
+                       f"{length}@{self._range_offsets[i]}" if length >= 0 else None,
+                       self._key_table[self._key_ids[i]], self._map_table[self._map_ids[i]],
+                       self.media_sequence + i, bool(self._discontinuities[i]))
+
+    def _table_id(self, table, tag, entry):
+        """
+        Index of a key / map in its table, repeated identical tags sharing one entry.
+        """
+        if tag not in self._table_ids:
+            table.append(entry)
+            self._table_ids[tag] = len(table) - 1
+        return self._table_ids[tag]
+
+    def _parse(self, text, pos):
+        """
+        Parse `text` from character `pos` on, appending segments.
+        """
+        duration = None
+        byterange = None
+        discontinuity = False
+        for line in text[pos:].splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith("#"):
+                if duration is None:
+                    continue  # a segment URI always follows its #EXTINF
+                uri = self._interned.setdefault(line, line)
+                offset, length = -1, -1
+                if byterange is not None:
+                    length, _, offset = byterange.partition("@")
+                    length = int(length)
+                    offset = int(offset) if offset else self._range_ends.get(uri, 0)
+                    self._range_ends[uri] = offset + length
+                self._uris.append(uri)
+                self._durations.append(duration)
+                self._range_offsets.append(offset)
+                self._range_lengths.append(length)
+                self._key_ids.append(self._key_id)
+                self._map_ids.append(self._map_id)
+                self._discontinuities.append(discontinuity)
+                duration, byterange, discontinuity = None, None, False
+                continue
+
+            tag, _, value = line.partition(":")
+            if tag == "#EXTINF":
+                duration = float(value.partition(",")[0] or 0)
+            elif tag == "#EXT-X-BYTERANGE":
+                byterange = value
+            elif tag == "#EXT-X-KEY":
+                attrs = _attributes(value)
+                if attrs.get("METHOD", "NONE").upper() == "NONE":
+                    self._key_id = 0
+                else:
+                    self._key_id = self._table_id(self._key_table, ("#EXT-X-KEY", value), Key(
+                        attrs.get("METHOD"), attrs.get("URI"), attrs.get("IV"),
+                        attrs.get("KEYFORMAT"), attrs.get("KEYFORMATVERSIONS")))
+            elif tag == "#EXT-X-MAP":
+                attrs = _attributes(value)
+                self._map_id = self._table_id(self._map_table, ("#EXT-X-MAP", value),
+                                              InitSection(attrs.get("URI"), attrs.get("BYTERANGE")))
+            elif tag == "#EXT-X-DISCONTINUITY":
+                discontinuity = True
+            elif tag == "#EXT-X-MEDIA-SEQUENCE":
+                if not self._durations:
+                    self.media_sequence = int(value)
+            elif tag == "#EXT-X-TARGETDURATION":
+                self.target_duration = int(float(value))
+            elif tag == "#EXT-X-ENDLIST":
+                self.is_endlist = True
+            elif tag == "#EXT-X-PLAYLIST-TYPE":
+                self.playlist_type = value.lower()
+            elif line.startswith(FALLBACK_TAGS):
+                raise UnsupportedPlaylist(f"{tag} needs the full m3u8 parser")
+
+    def refresh(self, text):
+        """
+        Update from a newer copy of the same (live) playlist; returns how many
+        segments are new. When the window moved on, or the copy doesn't
+        continue the known segments, it is parsed from scratch. Raises
+        NotAPlaylist, leaving the playlist as it was, for anything else.
+        """
+        _check_header(text)
+        before = self.media_sequence + len(self._durations)
+        match = re.search(r"^#EXT-X-MEDIA-SEQUENCE:\s*(\d+)", text, re.M)
+        first = int(match.group(1)) if match else 0
+        last = before - 1
+        # Find the known last segment's URI line in the new copy, without parsing
+        # anything before it
+        line = None
+        if self._durations and self.media_sequence <= first <= last:
+            line = next(islice(_URI_LINE.finditer(text), last - first, None), None)
+        if line is None or line.group().strip() != self._uris[-1]:
+            self._reset()
+            self._parse(text, 0)
+            return max(self.media_sequence + len(self._durations) - before, 0)
+
+        drop = first - self.media_sequence
+        if drop:
+            for column in (self._durations, self._range_offsets, self._range_lengths,
+                           self._key_ids, self._map_ids, self._discontinuities):
+                del column[:drop]
+            del self._uris[:drop]
+            self.media_sequence = first
+        target = re.search(r"^#EXT-X-TARGETDURATION:\s*([\d.]+)", text, re.M)
+        if target:
+            self.target_duration = int(float(target.group(1)))
+        self._parse(text, line.end())
+        return self.media_sequence + len(self._durations) - before
+
+    def dumps(self):
+        """
+        The playlist as text (regenerated, for logs and debugging).
+        """
+        lines = ["#EXTM3U"]
+        if self.target_duration is not None:
+            lines.append(f"#EXT-X-TARGETDURATION:{self.target_duration}")
+        lines.append(f"#EXT-X-MEDIA-SEQUENCE:{self.media_sequence}")
+        key = init = None
+        for seg in self.segments:
+            if seg.key is not key:
+                key = seg.key
+                lines.append("#EXT-X-KEY:METHOD=NONE" if key is None else
+                             f'#EXT-X-KEY:METHOD={key.method},URI="{key.uri}"'
+                             + (f",IV={key.iv}" if key.iv else ""))
+            if seg.init_section is not init and seg.init_section is not None:
+                init = seg.init_section
+                lines.append(f'#EXT-X-MAP:URI="{init.uri}"'
+                             + (f',BYTERANGE="{init.byterange}"' if init.byterange else ""))
+            if seg.discontinuity:
+                lines.append("#EXT-X-DISCONTINUITY")
+            lines.append(f"#EXTINF:{seg.duration:g},")
+            if seg.byterange:
+                lines.append(f"#EXT-X-BYTERANGE:{seg.byterange}")
+            lines.append(seg.uri)
+        if self.is_endlist:
+            lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+
+def load_playlist(text, uri=None):
+    """
+    Parse a playlist: media playlists with MediaPlaylist, master playlists and
+    anything using FALLBACK_TAGS with m3u8.loads(). Text that isn't a playlist
+    at all gives m3u8's result for it, one without segments.
+    """
+    try:
+        return MediaPlaylist(text, uri)
+    except (UnsupportedPlaylist, NotAPlaylist):
+        return m3u8.loads(text, uri=uri)
+
+
+def reload_playlist(playlist, text, uri=None):
+    """
+    A refreshed copy of `playlist` from newer `text`: updated in place when
+    it's a MediaPlaylist, otherwise parsed again.
+    """
+    if isinstance(playlist, MediaPlaylist):
+        try:
+            playlist.refresh(text)
+            return playlist
+        except UnsupportedPlaylist:
+            pass
+    return load_playlist(text, uri)
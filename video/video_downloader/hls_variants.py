@@ -0,0 +1,136 @@
+import time
+from urllib.parse import urljoin
+
+from hls_fetch import TransferStats, fetch_segments
+from hls_plan import build_plan
+from hls_playlist import load_playlist
+
+# How a rendition is picked from a master playlist:
+#   "highest"    - highest BANDWIDTH
+#   "resolution" - highest BANDWIDTH whose height is <= max_height
+#   "bitrate"    - highest BANDWIDTH that is <= max_bandwidth
+#   "throughput" - highest rendition whose first segments download faster
+#                  than real time (caps above still apply)
+VARIANT_POLICIES = ("highest", "resolution", "bitrate", "throughput")
+
+# Segments timed per candidate by the "throughput" policy
+PROBE_SEGMENTS = 3
+# Measured throughput must exceed the rendition's bitrate by this factor
+THROUGHPUT_HEADROOM = 1.25
+
+
+class VariantChoice:
+    """
+    The media playlist a download should use, plus any segments already
+    fetched while probing it (index -> SegmentResult) so they aren't fetched twice.
+    """
+
+    def __init__(self, url, playlist, prefetched=None):
+        self.url = url
+        self.playlist = playlist
+        self.prefetched = prefetched or {}
+
+
+def _bandwidth(variant):
+    info = variant.stream_info
+    return info.bandwidth or info.average_bandwidth or 0
+
+
+def _height(variant):
+    resolution = variant.stream_info.resolution
+    return resolution[1] if resolution else 0
+
+
+def rank_variants(playlist, policy="highest", max_height=None, max_bandwidth=None):
+    """
+    Return the variants allowed by the caps, best (highest bandwidth) first.
+    Falls back to the single lowest-bandwidth variant if the caps exclude all.
+    """
+    if policy not in VARIANT_POLICIES:
+        raise ValueError(f"Unknown variant policy {policy!r}, expected one of {VARIANT_POLICIES}")
+    if policy == "resolution" and max_height is None:
+        raise ValueError("The 'resolution' policy needs max_height")
+    if policy == "bitrate" and max_bandwidth is None:
+        raise ValueError("The 'bitrate' policy needs max_bandwidth")
+
+    variants = sorted(playlist.playlists, key=_bandwidth, reverse=True)
+    allowed = [v for v in variants
+               if (max_height is None or _height(v) <= max_height)
+               and (max_bandwidth is None or _bandwidth(v) <= max_bandwidth)]
+    return allowed or variants[-1:]
+
+
+def _load_media_playlist(session, url, timeout):
+    r = session.fetch(url, timeout=timeout)
+    return load_playlist(r.text, url)
+
+
+def _probe(session, url, playlist, concurrency, timeout):
+    """
+    Time the first few segments of a rendition (plus its init section, if any).
+    Returns (measured_bps, required_bps, results), or None when nothing could
+    be measured. Result indices match build_plan() so they can be reused.
+    """
+    plan = build_plan(playlist, url)
+    plan = plan[:PROBE_SEGMENTS + (plan[0].kind == "init")]
+    segments = [item.segment for item in plan if item.kind == "segment"]
+    urls = [item.url for item in plan]
+    stats = TransferStats()
+    start = time.perf_counter()
+    ranges = [item.byterange for item in plan]
+    results = {r.index: r for r in fetch_segments(urls, session, concurrency, timeout, stats,
+                                                  ranges=ranges)}
+    elapsed = time.perf_counter() - start
+
+    if any(not r.ok for r in results.values()) or not stats.bytes:
+        for r in results.values():
+            r.close()
+        return None
+    duration = sum(seg.duration or 0 for seg in segments)
+    measured_bps = stats.bytes * 8 / max(elapsed, 1e-6)
+    required_bps = stats.bytes * 8 / duration if duration else 0
+    return measured_bps, required_bps, results
+
+
+def select_variant(session, master_url, playlist, policy="highest", max_height=None,
+                   max_bandwidth=None, concurrency=1, timeout=10):
+    """
+    Pick a rendition from master `playlist` and load its media playlist.
+
+    With the "throughput" policy the best candidate's first PROBE_SEGMENTS
+    segments are timed; if they arrive slower than THROUGHPUT_HEADROOM x their
+    own bitrate the selector steps down to the best rendition the measured
+    throughput can sustain before the download commits.
+    """
+    ranked = rank_variants(playlist, policy, max_height, max_bandwidth)
+    print(f"[i] Master playlist with {len(playlist.playlists)} variants, policy '{policy}'.")
+
+    i = 0
+    while True:
+        variant = ranked[i]
+        variant_url = urljoin(master_url, variant.uri)
+        media = _load_media_playlist(session, variant_url, timeout)
+        print(f"[→] Variant {_bandwidth(variant) // 1000} kbit/s "
+              f"({'x'.join(map(str, variant.stream_info.resolution or ())) or 'n/a'}): {variant_url}")
+
+        if policy != "throughput" or i == len(ranked) - 1 or not media.segments:
+            return VariantChoice(variant_url, media)
+
+        probe = _probe(session, variant_url, media, concurrency, timeout)
+        if probe is None:
+            print("[!] Probe failed, stepping down one rendition.")
+            i += 1
+            continue
+
+        measured_bps, required_bps, results = probe
+        print(f"[i] Measured {measured_bps / 1e6:.2f} Mbit/s, "
+              f"rendition needs {required_bps / 1e6:.2f} Mbit/s.")
+        if measured_bps >= required_bps * THROUGHPUT_HEADROOM:
+            return VariantChoice(variant_url, media, results)
+
+        for r in results.values():
+            r.close()
+        # Jump straight to the best rendition the link can sustain
+        sustainable = measured_bps / THROUGHPUT_HEADROOM
+        i = next((j for j in range(i + 1, len(ranked)) if _bandwidth(ranked[j]) <= sustainable),
+                 len(ranked) - 1)
@@ -1,14 +1,22 @@
 import os
+import sys
 import time
 import json
 import requests
 import undetected_chromedriver as uc
-from bs4 import BeautifulSoup
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from datetime import datetime
 
+# Shared helpers (forgehub/) live at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from forgehub.captures import CaptureStore
+from forgehub.media_watch import enable_network_log, wait_for_media
+from forgehub.store import shared_store
+from forgehub.telemetry import TELEMETRY, job_scope
+from capture_scan import scan_data
+
 # Target URL
 # VIDEO_PAGE_URL = "https://ottverse.com/free-hls-m3u8-test-urls/"
 VIDEO_PAGE_URL = "https://castr.com/hlsplayer/"
@@ -27,33 +35,21 @@ def setup_driver():
     options.add_argument("--disable-dev-shm-usage")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-popup-blocking")
+    # Log CDP network events, so the video's request is seen the moment it's made
+    enable_network_log(options)
 
     driver = uc.Chrome(options=options)
     return driver
 
-def get_latest_html_file():
-    """
-    Finds the latest HTML file saved in the `browser_captures/` folder.
+def extract_video_src(html_file, data):
     """
-    html_files = sorted(
-        [os.path.join(SAVE_FOLDER, f) for f in os.listdir(SAVE_FOLDER) if f.endswith(".html")],
-        key=os.path.getmtime,
-        reverse=True
-    )
-    return html_files[0] if html_files else None
-
-def extract_video_src(html_file):
-    """
-    Parses the latest HTML file to extract the `video.src` URL.
+    Parses the latest page snapshot (`data`, saved as `html_file`) to extract the `video.src` URL.
     """
     try:
-        with open(html_file, "r", encoding="utf-8") as file:
-            soup = BeautifulSoup(file, "html.parser")
-
         # Find video tag
-        video_tag = soup.find("video")
-        if video_tag and video_tag.get("src"):
-            video_url = video_tag["src"]
+        video_tags = scan_data(data)["video_tag"]
+        if video_tags:
+            video_url = video_tags[0]
             print(f"[SUCCESS] Extracted Video URL: {video_url}")
             return video_url
         else:
@@ -76,18 +72,16 @@ def download_video(video_url, output_folder="downloads"):
         file_path = os.path.join(output_folder, file_name)
 
         print(f"[INFO] Downloading video from {video_url}...")
-        response = requests.get(video_url, stream=True)
-
-        if response.status_code == 200:
-            with open(file_path, "wb") as file:
-                for chunk in response.iter_content(chunk_size=1024):
-                    file.write(chunk)
-            print(f"[SUCCESS] Video saved at: {file_path}")
-            return file_path
-        else:
-            print(f"[ERROR] Failed to download video. Status: {response.status_code}")
-            return None
-
+        # Through the media store: a video fetched before (on any run, from any
+        # page) is linked from it; new ones use parallel byte ranges when allowed
+        with job_scope(file_name):
+            how = shared_store().fetch(video_url, file_path, ranged=True)
+        print(f"[SUCCESS] Video saved at: {file_path} ({how})")
+        return file_path
+
+    except requests.exceptions.HTTPError as e:
+        print(f"[ERROR] Failed to download video. Status: {e.response.status_code}")
+        return None
     except Exception as e:
         print(f"[ERROR] Download error: {e}")
         return None
@@ -97,6 +91,7 @@ def main():
     Main function to execute the browser capture script.
     """
     driver = setup_driver()
+    captures = CaptureStore(SAVE_FOLDER)
 
     try:
         print("[INFO] Opening target page...")
@@ -118,32 +113,38 @@ def main():
         print("[SUCCESS] Overlay removed. Monitoring page for video playback...")
 
         # Step 3: Monitor for video to start playing
-        start_time = time.time()
-        while time.time() - start_time < 60:  # Run for 60 seconds
+        def save_page_source():
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-            # Save page source every second
-            html_path = os.path.join(SAVE_FOLDER, f"page_{timestamp}.html")
-            with open(html_path, "w", encoding="utf-8") as file:
-                file.write(driver.page_source)
-            print(f"[INFO] Page source saved: {html_path}")
+            # Save page source every second; repeated / barely changed pages
+            # only cost a manifest line or a small delta in the capture store
+            html_name = f"page_{timestamp}.html"
+            how = captures.save(html_name, driver.page_source)
+            print(f"[INFO] Page source saved: {html_name} ({how})")
 
-            time.sleep(1)  # Capture every second
+        save_page_source()
+        # Up to 60 seconds, but done as soon as the player requests its manifest / media
+        media_url = wait_for_media(driver, timeout=60, on_tick=save_page_source)
+        if media_url:
+            print(f"[SUCCESS] Video playback started: {media_url}")
+            save_page_source()  # the page as playback starts
 
-        print("[INFO] Completed monitoring. Extracting video source...")
+        print(f"[INFO] Completed monitoring ({captures.summary()}). Extracting video source...")
 
-        # Step 4: Extract video.src from the latest HTML file
-        latest_html = get_latest_html_file()
+        # Step 4: Extract video.src from the latest page snapshot
+        latest_html = captures.latest(".html")
         if latest_html:
-            video_url = extract_video_src(latest_html)
+            video_url = extract_video_src(latest_html, captures.read(latest_html))
             if video_url:
                 # Step 5: Download the video
                 download_video(video_url)
+                TELEMETRY.export(os.path.join("downloads", "telemetry"))
 
     except Exception as e:
         print(f"[ERROR] Exception occurred: {e}")
 
     finally:
+        captures.close()
         driver.quit()
 
 if __name__ == "__main__":
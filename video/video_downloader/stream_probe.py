@@ -0,0 +1,104 @@
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Outcomes of a probe; everything but "alive" goes into the negative cache
+PROBE_STATUSES = ("alive", "forbidden", "timeout", "not-a-playlist", "unreachable")
+# Seconds a dead URL is skipped before it is probed again
+NEGATIVE_CACHE_TTL = 6 * 3600
+PROBE_TIMEOUT = 5
+PROBE_CONCURRENCY = 16
+# Enough of the body to see the #EXTM3U header (after a BOM / whitespace)
+PROBE_READ_BYTES = 1024
+
+
+class ProbeCache:
+    """
+    On-disk negative cache: URL -> {"status", "detail", "checked"} for probes
+    that found a URL dead. Entries older than `ttl` seconds are ignored.
+    """
+
+    def __init__(self, path, ttl=NEGATIVE_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                print(f"[!] Ignoring unreadable probe cache {path}")
+
+    def get(self, url):
+        """
+        Return the cached entry for a URL still known dead, else None.
+        """
+        entry = self.entries.get(url)
+        if entry and time.time() - entry["checked"] < self.ttl:
+            return entry
+        return None
+
+    def put(self, url, status, detail=""):
+        if status == "alive":
+            self.entries.pop(url, None)
+        else:
+            self.entries[url] = {"status": status, "detail": detail, "checked": time.time()}
+
+    def save(self):
+        now = time.time()
+        live = {url: e for url, e in self.entries.items() if now - e["checked"] < self.ttl}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(live, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+def probe_url(session, url, timeout=PROBE_TIMEOUT):
+    """
+    Fetch the start of `url` and classify it as one of PROBE_STATUSES.
+    Returns (status, detail).
+    """
+    try:
+        with session.get(url, timeout=timeout, stream=True) as r:
+            if r.status_code in (401, 403):
+                return "forbidden", f"HTTP {r.status_code}"
+            if r.status_code >= 400:
+                return "unreachable", f"HTTP {r.status_code}"
+            head = next(r.iter_content(PROBE_READ_BYTES), b"")
+    except requests.exceptions.Timeout:
+        return "timeout", f"no response in {timeout}s"
+    except requests.exceptions.RequestException as e:
+        return "unreachable", type(e).__name__
+
+    if not head.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"#EXTM3U"):
+        return "not-a-playlist", r.headers.get("Content-Type", "no #EXTM3U header")
+    return "alive", ""
+
+
+def probe_urls(session, urls, cache=None, concurrency=PROBE_CONCURRENCY, timeout=PROBE_TIMEOUT):
+    """
+    Probe `urls` concurrently, skipping those `cache` still lists as dead.
+    Returns {url: (status, detail)}; fresh results are stored in `cache`.
+    """
+    results = {}
+    to_probe = []
+    for url in urls:
+        entry = cache.get(url) if cache is not None else None
+        if entry:
+            results[url] = (entry["status"], f"cached: {entry['detail']}")
+        else:
+            to_probe.append(url)
+
+    if to_probe:
+        with ThreadPoolExecutor(max_workers=max(min(concurrency, len(to_probe)), 1)) as pool:
+            probed = pool.map(lambda url: probe_url(session, url, timeout), to_probe)
+            for url, (status, detail) in zip(to_probe, probed):
+                results[url] = (status, detail)
+                if cache is not None:
+                    cache.put(url, status, detail)
+    if cache is not None:
+        cache.save()
+    return results
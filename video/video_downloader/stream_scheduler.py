@@ -0,0 +1,147 @@
+import time
+import threading
+from urllib.parse import urlparse
+
+from forgehub.retry import BREAKER
+
+# Streams downloaded at the same time, overall and per host
+MAX_PARALLEL_STREAMS = 4
+MAX_STREAMS_PER_HOST = 2
+# Attempts per stream before it is reported as failed
+MAX_ATTEMPTS = 3
+# Delay before a failed stream is retried, doubled after every failure
+RETRY_BACKOFF = 15.0
+
+
+class StreamJob:
+    """
+    One stream to download. Lower `priority` values run first; jobs with equal
+    priority keep their submission order.
+    """
+
+    def __init__(self, url, output_name, priority=0):
+        self.url = url
+        self.output_name = output_name
+        self.priority = priority
+        self.host = urlparse(url).hostname or ""
+        self.status = "queued"
+        self.attempts = 0
+        self.elapsed = 0.0
+        self.output = None
+        self.error = None
+        self.not_before = 0.0
+
+
+class StreamScheduler:
+    """
+    Runs `download(job)` for a batch of StreamJobs on a fixed set of worker
+    threads. A job is started only when both the global and its host's limit
+    allow it; `download` returns the output path, or None / raises on failure.
+    Failed jobs go back in the queue with a growing delay, and jobs on a host
+    whose circuit breaker is open are held back until it closes, so the
+    remaining healthy streams keep the workers busy while a dead host waits.
+    """
+
+    def __init__(self, download, max_parallel=MAX_PARALLEL_STREAMS,
+                 max_per_host=MAX_STREAMS_PER_HOST, max_attempts=MAX_ATTEMPTS,
+                 retry_backoff=RETRY_BACKOFF):
+        self.download = download
+        self.max_parallel = max(int(max_parallel), 1)
+        self.max_per_host = max(int(max_per_host), 1)
+        self.max_attempts = max(int(max_attempts), 1)
+        self.retry_backoff = retry_backoff
+        self.jobs = []
+        self._queue = []
+        self._running = {}
+        self._cond = threading.Condition()
+
+    def add(self, url, output_name, priority=0):
+        job = StreamJob(url, output_name, priority)
+        self.jobs.append(job)
+        return job
+
+    def _next_job(self):
+        """
+        Block until a job may start and return it, or None when the batch is done.
+        """
+        with self._cond:
+            while True:
+                if not self._queue and not self._running:
+                    return None
+                now = time.monotonic()
+                ready_at = {}
+                for job in self._queue:
+                    # Jobs on a host whose circuit is open wait for it to close
+                    ready_at[job] = max(job.not_before, BREAKER.open_until(job.url))
+                    if ready_at[job] <= now and self._running.get(job.host, 0) < self.max_per_host:
+                        self._queue.remove(job)
+                        self._running[job.host] = self._running.get(job.host, 0) + 1
+                        job.status = "running"
+                        return job
+                # Wake up for the earliest retry, or when a running job finishes
+                waits = [t - now for t in ready_at.values() if t > now]
+                self._cond.wait(min(waits) if waits else None)
+
+    def _finished(self, job, output, error):
+        with self._cond:
+            self._running[job.host] -= 1
+            if not self._running[job.host]:
+                del self._running[job.host]
+            job.output, job.error = output, error
+            if output:
+                job.status = "done"
+            elif job.attempts < self.max_attempts:
+                delay = self.retry_backoff * 2 ** (job.attempts - 1)
+                job.status = "retrying"
+                job.not_before = time.monotonic() + delay
+                self._queue.append(job)
+                print(f"[!] {job.output_name}: attempt {job.attempts} failed, "
+                      f"retrying in {delay:.0f}s.")
+            else:
+                job.status = "failed"
+            self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            job.attempts += 1
+            start = time.perf_counter()
+            output, error = None, None
+            try:
+                output = self.download(job)
+            except Exception as e:
+                error = e
+            job.elapsed += time.perf_counter() - start
+            self._finished(job, output, error)
+
+    def run(self):
+        """
+        Download every added job and return them with their final status.
+        """
+        with self._cond:
+            # Stable sort: equal priorities keep their submission order
+            self._queue = sorted(self.jobs, key=lambda job: job.priority)
+        workers = [threading.Thread(target=self._worker, daemon=True)
+                   for _ in range(min(self.max_parallel, len(self.jobs)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            # join() with a timeout keeps the main thread responsive to ^C
+            while worker.is_alive():
+                worker.join(0.5)
+        return self.jobs
+
+    def report(self):
+        """
+        Print per-job status, attempts and time spent downloading.
+        """
+        print("\n[i] Batch report:")
+        for job in sorted(self.jobs, key=lambda job: job.status != "done"):
+            mark = "[✓]" if job.status == "done" else "[-]"
+            detail = job.output or job.error or job.url
+            print(f"{mark} {job.output_name:<12} {job.status:<8} {job.attempts} attempt(s) "
+                  f"{job.elapsed:7.1f}s  {job.host}  {detail}")
+        done = sum(job.status == "done" for job in self.jobs)
+        print(f"[i] {done}/{len(self.jobs)} streams downloaded.")